@@ -1,7 +1,10 @@
 import features.viewer as viewer
+import multiprocessing
 import sys
 
-app = viewer.QApplication(sys.argv)  # Create QApplication first
-pdf_viewer = viewer.PDFViewer()      # Then create widgets
-pdf_viewer.show()
-sys.exit(app.exec_())
\ No newline at end of file
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Render workers in the frozen executable
+    app = viewer.QApplication(sys.argv)  # Create QApplication first
+    pdf_viewer = viewer.PDFViewer()      # Then create widgets
+    pdf_viewer.show()
+    sys.exit(app.exec_())
\ No newline at end of file
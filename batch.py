@@ -0,0 +1,7 @@
+import features.batch as batch
+import multiprocessing
+import sys
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Batch workers in a frozen executable
+    sys.exit(batch.main())
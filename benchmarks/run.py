@@ -0,0 +1,291 @@
+"""
+Benchmark suite for PeeDoFile.
+
+Run from the repository root:
+
+    python -m benchmarks.run -o results.json
+    python -m benchmarks.run --quick
+
+Synthetic documents (see synthetic.py) are generated once into the work
+directory. The results are printed as JSON, or written to --output, so
+runs can be compared across commits. Qt runs on the offscreen platform
+unless QT_QPA_PLATFORM says otherwise, so no display is needed.
+"""
+import argparse
+import datetime
+import json
+import math
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import shutil
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from features.saver import save_document
+from features.session import DocumentSession
+from features.strokes import StrokeStore
+from . import synthetic
+
+ZOOMS = (0.5, 1.0, 2.0, 4.0)
+STROKE_COUNTS = (100, 1000, 5000)
+QUICK_STROKE_COUNTS = (100, 1000)
+POINTS_PER_STROKE = 50
+STARTUP_TARGET_MS = 500  # Launch to visible window, including the interpreter
+
+def measure(function, repeats):
+    """Median wall time of function in milliseconds"""
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        times.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(times), 3)
+
+def make_strokes(count, page_count, width=595, height=842):
+    """count wavy strokes spread over the first pages, seeded by position"""
+    store = StrokeStore()
+    style = store.style_index((255, 0, 0, 255), 2)
+    for i in range(count):
+        stroke = store.begin_stroke(i % min(page_count, 3), style)
+        x0 = 20 + (i * 37) % int(width - 140)
+        y0 = 20 + (i * 53) % int(height - 40)
+        for k in range(POINTS_PER_STROKE):
+            stroke.add_point(x0 + k * 2, y0 + 10 * math.sin(k / 4 + i))
+    return store
+
+def bench_open(path, repeats):
+    def open_document():
+        session = DocumentSession(path)
+        session.page_count
+        session.close()
+    return measure(open_document, repeats)
+
+def bench_render(path, repeats):
+    """Interpretation time of the first page and render time per zoom level"""
+    session = DocumentSession(path)
+    try:
+        page = session.page(0)
+        interpret_ms = measure(lambda: page.get_displaylist(), repeats)
+        # Pages that would not fit in memory at high zoom are timed on one tile, like the view renders them
+        tiled = page.rect.width * page.rect.height * 4 * 4 > 64 * 1024 * 1024
+        render_ms = {}
+        for zoom in ZOOMS:
+            scale = zoom * 2  # The view's base resolution is 2 pixels per point
+            clip = fitz.Rect(0, 0, 512 / scale, 512 / scale) if tiled else None
+            session.render(0, scale, clip)  # The display list is built outside the timing
+            render_ms[str(zoom)] = measure(lambda: session.render(0, scale, clip), repeats)
+        return {'interpret_ms': interpret_ms, 'tiled': tiled, 'render_ms': render_ms}
+    finally:
+        session.close()
+
+def bench_save(path, stroke_counts, workdir):
+    """Save time and output size with n strokes, as editable annotations and flattened"""
+    with fitz.open(path) as doc:
+        page_count = doc.page_count
+    results = {}
+    for count in stroke_counts:
+        strokes = make_strokes(count, page_count)
+        for flatten in (False, True):
+            output = os.path.join(workdir, f"save-{count}-{int(flatten)}.pdf")
+            timer = save_document(path, output, strokes, flatten=flatten)
+            results[f"{count}_{'flattened' if flatten else 'editable'}"] = {
+                'ms': round(timer.total * 1000, 3),
+                'bytes': os.path.getsize(output),
+                'phases_ms': {name: round(seconds * 1000, 3) for name, seconds in timer.phases.items()},
+            }
+            os.remove(output)
+    return results
+
+def bench_startup(repeats):
+    """Time from launching the app in a fresh interpreter until its window is shown"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    state_dir = tempfile.mkdtemp(prefix='peedofile-startup-')
+    # Start from empty settings and caches rather than the user's
+    env = dict(os.environ, QT_QPA_PLATFORM=os.environ.get('QT_QPA_PLATFORM', 'offscreen'),
+               XDG_CONFIG_HOME=os.path.join(state_dir, 'config'), XDG_CACHE_HOME=os.path.join(state_dir, 'cache'))
+    times = []
+    pymupdf_loaded = False
+    for _ in range(repeats):
+        start = time.perf_counter()
+        child = subprocess.Popen([sys.executable, '-m', 'benchmarks.startup'], cwd=root, env=env,
+                                 stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        line = child.stdout.readline()
+        times.append((time.perf_counter() - start) * 1000)
+        child.wait()
+        if not line.startswith('shown'):
+            raise RuntimeError("startup benchmark child did not show its window")
+        pymupdf_loaded = pymupdf_loaded or line.split()[1] == '1'
+    shutil.rmtree(state_dir, ignore_errors=True)
+    shown_ms = round(statistics.median(times), 3)
+    return {
+        'window_shown_ms': shown_ms,
+        'target_ms': STARTUP_TARGET_MS,
+        'target_met': shown_ms <= STARTUP_TARGET_MS,
+        'pymupdf_loaded_before_shown': pymupdf_loaded,
+    }
+
+def wait_for(app, condition, timeout=60):
+    start = time.perf_counter()
+    while not condition():
+        if time.perf_counter() - start > timeout:
+            raise TimeoutError("benchmark step timed out")
+        app.processEvents()
+        time.sleep(0.001)
+    return (time.perf_counter() - start) * 1000
+
+def bench_gui(paths, stroke_counts, repeats):
+    """
+    First-page latency per document and annotation paint cost, with the real widgets.
+
+    The viewer gets settings and caches in a temporary directory, so runs
+    neither read nor touch the user's. First pages are timed with the disk
+    cache off, then again with it on once a first open has filled it.
+    """
+    state_dir = tempfile.mkdtemp(prefix='peedofile-gui-')
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    # Where Qt keeps settings and caches on Linux; set before Qt reads them
+    os.environ['XDG_CONFIG_HOME'] = os.path.join(state_dir, 'config')
+    os.environ['XDG_CACHE_HOME'] = os.path.join(state_dir, 'cache')
+    from PyQt5.QtCore import QSettings
+    from PyQt5.QtWidgets import QApplication
+    for settings_format in (QSettings.NativeFormat, QSettings.IniFormat):
+        QSettings.setPath(settings_format, QSettings.UserScope, os.path.join(state_dir, 'config'))
+    app = QApplication.instance() or QApplication(sys.argv)
+    from features.viewer import PDFViewer
+    from features.metrics import metrics
+
+    viewer = PDFViewer()
+    # The cache locations are resolved at construction; point them all at the temporary directory
+    viewer.disk_cache_dir = os.path.join(state_dir, 'renders')
+    viewer.search_cache_dir = os.path.join(state_dir, 'search')
+    viewer.recent_files_manager.thumbnail_dir = os.path.join(state_dir, 'thumbnails')
+    viewer.set_disk_cache(False)
+    viewer.resize(1200, 900)
+    viewer.show()
+    view = viewer.page_view
+
+    def first_page_shown():
+        return any(slot[0] == 0 and slot not in view.draft_slots for slot in view.images)
+
+    def open_document(path):
+        viewer.current_file_path = path
+        start = time.perf_counter()
+        viewer.display_pdf(path)
+        view.render_cache.clear()  # Measure rendering, not the cache of the previous run
+        view.images.clear()
+        view.update_visible_pages()
+        return (time.perf_counter() - start) * 1000 + wait_for(app, first_page_shown)
+
+    results = {'first_page_ms': {}, 'disk_cache_first_page_ms': {}}
+    try:
+        # The first open also starts the render worker processes
+        results['cold_first_page_ms'] = round(open_document(paths['many_pages']), 3)
+        for name, path in paths.items():
+            results['first_page_ms'][name] = round(statistics.median(
+                open_document(path) for _ in range(repeats)), 3)
+
+        # Pages read back from the disk cache, as when reopening a file in a later session
+        viewer.set_disk_cache(True)
+        for name, path in paths.items():
+            open_document(path)  # Fills the cache
+            results['disk_cache_first_page_ms'][name] = round(statistics.median(
+                open_document(path) for _ in range(repeats)), 3)
+        viewer.set_disk_cache(False)
+
+        # Annotation painting on the text document at the default zoom
+        open_document(paths['many_pages'])
+        viewer.annotation_mode = True
+        viewer.annotator.show()
+        viewer.update_annotator_geometry()
+        annotator = viewer.annotator
+        viewport = view.visible_rect()
+        paint = {}
+        for count in stroke_counts:
+            annotator.annotations = make_strokes(count, view.page_count())
+            annotator.pens.clear()
+            annotator.invalidate_layer()
+
+            def full_repaint():
+                annotator.invalidate_layer()
+                annotator.grab(viewport)
+            segment = viewport.adjusted(100, 100, -viewport.width() + 140, -viewport.height() + 140)
+            paint[str(count)] = {
+                'layer_build_ms': measure(full_repaint, repeats),
+                'cached_repaint_ms': measure(lambda: annotator.grab(viewport), repeats),
+                'segment_repaint_ms': measure(lambda: annotator.grab(segment), repeats),
+            }
+        results['annotation_paint'] = paint
+        annotator.clear_annotations()
+        # Everything the instrumented hot paths recorded during the run
+        results['metrics'] = metrics.snapshot()
+    finally:
+        viewer.close()
+        shutil.rmtree(state_dir, ignore_errors=True)
+    return results
+
+def metadata():
+    meta = {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'pymupdf': fitz.VersionBind,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+        meta.update(qt=QT_VERSION_STR, pyqt=PYQT_VERSION_STR)
+    except ImportError:
+        pass
+    return meta
+
+def run(workdir, quick=False, repeats=5, gui=True, log=sys.stderr):
+    paths = synthetic.generate(os.path.join(workdir, 'documents'), quick=quick)
+    stroke_counts = QUICK_STROKE_COUNTS if quick else STROKE_COUNTS
+    results = {'meta': dict(metadata(), quick=quick, repeats=repeats), 'documents': {}}
+    for name, path in paths.items():
+        print(f"Benchmarking {name}...", file=log)
+        with fitz.open(path) as doc:
+            page_count = doc.page_count
+        results['documents'][name] = {
+            'pages': page_count,
+            'bytes': os.path.getsize(path),
+            'open_ms': bench_open(path, repeats),
+            **bench_render(path, repeats),
+        }
+    print("Benchmarking save...", file=log)
+    results['save'] = bench_save(paths['many_pages'], stroke_counts, workdir)
+    if gui:
+        print("Benchmarking startup...", file=log)
+        results['startup'] = bench_startup(repeats)
+        print("Benchmarking GUI...", file=log)
+        results['gui'] = bench_gui(paths, stroke_counts, repeats)
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure PeeDoFile performance on synthetic PDFs.")
+    parser.add_argument("-o", "--output", help="write the JSON results here instead of printing them")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "peedofile-bench"),
+                        help="where synthetic documents are generated and kept between runs")
+    parser.add_argument("--quick", action="store_true", help="smaller documents and fewer strokes")
+    parser.add_argument("--repeats", type=int, default=5, help="runs per measurement (the median is kept)")
+    parser.add_argument("--no-gui", action="store_true", help="skip the measurements that need Qt widgets")
+    args = parser.parse_args(argv)
+
+    results = run(args.workdir, args.quick, args.repeats, not args.no_gui)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()
+    sys.exit(main())
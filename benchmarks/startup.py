@@ -0,0 +1,19 @@
+"""
+Child process for the startup benchmark: shows the main window, then
+reports on stdout and exits. run.py times it from launch to the report.
+"""
+import os
+import sys
+
+if __name__ == '__main__':
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtWidgets import QApplication
+    app = QApplication(sys.argv)
+    import features.viewer as viewer
+    window = viewer.PDFViewer()
+    # Whether anything pulled PyMuPDF in before the event loop could preload it
+    eager = 'fitz' in sys.modules
+    window.show()
+    app.processEvents()
+    print(f"shown {int(eager)}", flush=True)
+    os._exit(0)  # Teardown is not part of startup
@@ -0,0 +1,95 @@
+"""
+Synthetic documents for the benchmarks.
+
+Every document is generated with PyMuPDF from fixed parameters and a fixed
+random seed, so runs on different machines measure the same input.
+"""
+import os
+import random
+
+import fitz  # PyMuPDF
+
+LOREM = ("Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod "
+         "tempor incididunt ut labore et dolore magna aliqua. ")
+
+def many_pages(path, pages=500):
+    """Plain text pages, like a long report"""
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        page.insert_textbox(page.rect + (54, 54, -54, -54), f"Page {number + 1}\n\n" + LOREM * 30, fontsize=10)
+    doc.save(path, deflate=True)
+    doc.close()
+
+def vector_heavy(path, pages=5, lines=20000):
+    """Pages made of many thin vector paths, like maps or CAD drawings"""
+    rng = random.Random(1)
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        shape = page.new_shape()
+        width, height = page.rect.width, page.rect.height
+        for i in range(lines):
+            # Short segments, like contour lines, rather than page-spanning strokes
+            x, y = rng.uniform(0, width), rng.uniform(0, height)
+            shape.draw_line((x, y), (x + rng.uniform(-15, 15), y + rng.uniform(-15, 15)))
+            if i % 500 == 499:
+                shape.finish(color=(rng.random(), rng.random(), rng.random()), width=0.3)
+        shape.finish(width=0.3)
+        shape.commit()
+    doc.save(path, deflate=True)
+    doc.close()
+
+def scanned(path, pages=4, size=(2480, 3508)):
+    """Full-page photographic images at 300 dpi, like scans"""
+    rng = random.Random(2)
+    doc = fitz.open()
+    width, height = size[0] // 8, size[1] // 8
+    for _ in range(pages):
+        # Low-frequency noise scaled up compresses like a real scan rather than like static
+        samples = bytes(rng.randrange(160, 256) for _ in range(width * height * 3))
+        image = fitz.Pixmap(fitz.Pixmap(fitz.csRGB, width, height, samples, False), size[0], size[1], None)
+        page = doc.new_page(width=size[0] * 72 / 300, height=size[1] * 72 / 300)
+        # Scanners store JPEG, which MuPDF has to decode on every render
+        page.insert_image(page.rect, stream=image.tobytes("jpeg", jpg_quality=75))
+    doc.save(path, deflate=True)
+    doc.close()
+
+def huge_page(path, inches=200):
+    """One page at the PDF size limit with a grid, like a poster or floor plan"""
+    doc = fitz.open()
+    side = inches * 72
+    page = doc.new_page(width=side, height=side)
+    shape = page.new_shape()
+    step = side / 200
+    for i in range(201):
+        shape.draw_line((0, i * step), (side, i * step))
+        shape.draw_line((i * step, 0), (i * step, side))
+    shape.finish(color=(0, 0, 0.6), width=2)
+    shape.commit()
+    for i in range(0, 200, 10):
+        page.insert_text((i * step + 10, i * step + 40), f"Cell {i}", fontsize=36)
+    doc.save(path, deflate=True)
+    doc.close()
+
+# Name -> (generator, arguments for a full run, arguments for a quick run)
+DOCUMENTS = {
+    'many_pages': (many_pages, {'pages': 500}, {'pages': 50}),
+    'vector_heavy': (vector_heavy, {'pages': 5, 'lines': 20000}, {'pages': 2, 'lines': 5000}),
+    'scanned': (scanned, {'pages': 4}, {'pages': 1}),
+    'huge_page': (huge_page, {'inches': 200}, {'inches': 200}),
+}
+
+def generate(directory, quick=False):
+    """Write every synthetic document into directory once; returns name -> path"""
+    os.makedirs(directory, exist_ok=True)
+    paths = {}
+    for name, (generator, full_args, quick_args) in DOCUMENTS.items():
+        args = quick_args if quick else full_args
+        suffix = "-".join(f"{key}{value}" for key, value in sorted(args.items()))
+        path = os.path.join(directory, f"{name}-{suffix}.pdf")
+        if not os.path.exists(path):
+            generator(path + ".part", **args)
+            os.replace(path + ".part", path)
+        paths[name] = path
+    return paths
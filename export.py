@@ -0,0 +1,7 @@
+import features.export as export
+import multiprocessing
+import sys
+
+if __name__ == '__main__':
+    multiprocessing.freeze_support()  # Export workers in a frozen executable
+    sys.exit(export.main())
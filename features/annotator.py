@@ -1,23 +1,54 @@
 from PyQt5.QtWidgets import QWidget, QPushButton, QColorDialog, QHBoxLayout, QFrame
-from PyQt5.QtGui import QPainter, QPen, QColor, QPalette
-from PyQt5.QtCore import Qt, QPoint, QSize
-import fitz
-import os
-import tempfile
-import shutil
-import time
+from PyQt5.QtGui import QPainter, QPen, QColor, QPalette, QPolygonF, QImage
+from PyQt5.QtCore import Qt, QPoint, QPointF, QSize, QRect, QRectF
+
+from .metrics import metrics
+from .strokes import StrokeStore
 
 # Control Frame removed as controls are now in toolbar
 
 class PDFAnnotator(QWidget):
+    """
+    Overlay for drawing on the pages.
+
+    The tool is 'pen' for drawing, 'eraser' for removing whole strokes, or
+    'select' for picking strokes with a lasso (a rectangle with Shift),
+    then moving, recoloring or deleting them. Erasing and selecting query
+    the StrokeStore's per-page grids, so they only look at the segments
+    near the pointer however many points a page holds.
+    """
     def __init__(self, parent=None):
         super().__init__(parent)
+        self.tool = 'pen'
         self.drawing = False
-        self.last_point = QPoint()
         self.current_color = QColor(Qt.red)
-        self.line_width = 2
-        self.annotations = []
+        self.line_width = 2  # In PDF points, so strokes keep their size at every zoom
+        self.annotations = StrokeStore()  # Strokes in PDF page coordinates
+        self.current_stroke = None
+        self.live_polygon = QPolygonF()  # Stroke being drawn, in widget coordinates
         self.pdf_rect = None
+        self.page_view = None
+        # Finished strokes drop points closer than this (in screen pixels at the
+        # zoom they were drawn at) to the simplified line
+        self.simplify_tolerance = 0.5
+        # Save strokes into the page content instead of as editable ink annotations
+        self.flatten = False
+        self.eraser_radius = 8  # In screen pixels
+        self.erasing = False
+        self.selected = []  # Selected strokes, all on select_page
+        self.select_page = -1
+        self.select_path = QPolygonF()  # Lasso or rectangle being dragged, in widget coordinates
+        self.select_rect_mode = False
+        self.move_start = None  # Widget position where dragging the selection started
+        self.move_offset = QPointF()
+        self.hidden_strokes = set()  # Left out of the layer while they are dragged
+
+        # Committed strokes are rasterized once into a layer covering the
+        # viewport (plus a margin); paints copy from it instead of redrawing
+        self.layer = None
+        self.layer_rect = QRect()
+        self.layer_scale = None
+        self.pens = {}  # Style index -> QPen at layer_scale
         
         # Make the widget transparent
         self.setAttribute(Qt.WA_TranslucentBackground)
@@ -37,36 +68,232 @@ class PDFAnnotator(QWidget):
 
     def clear_annotations(self):
         self.annotations.clear()
-        self.update()
+        self.selected = []
+        self.invalidate_layer()
+
+    def set_tool(self, tool):
+        """Switch between the 'pen', 'eraser' and 'select' tools"""
+        self.tool = tool
+        self.clear_selection()
+        self.setCursor(Qt.CrossCursor if tool == 'pen' else Qt.PointingHandCursor if tool == 'eraser'
+                       else Qt.ArrowCursor)
+        # Selections take keyboard focus so Delete can remove them
+        self.setFocusPolicy(Qt.ClickFocus if tool == 'select' else Qt.NoFocus)
+
+    def clear_selection(self):
+        if self.selected:
+            self.selected = []
+            self.update()
+
+    def delete_selection(self):
+        for stroke in self.selected:
+            self.annotations.remove_stroke(stroke)
+        self.selected = []
+        self.invalidate_layer()
+
+    def recolor_selection(self, color):
+        """Give the selected strokes a new color; returns False if nothing is selected"""
+        if not self.selected:
+            return False
+        self.annotations.restyle_strokes(self.selected, color.getRgb())
+        self.invalidate_layer()
+        return True
+
+    def erase_at(self, pos):
+        """Remove every stroke the eraser touches at a widget position"""
+        page = self.page_view.page_at(pos)
+        if page < 0:
+            return
+        x, y = self.page_view.map_to_page(page, pos)
+        hits = self.annotations.strokes_at(page, x, y, self.eraser_radius / self.page_view.scale)
+        if hits:
+            for stroke in hits:
+                self.annotations.remove_stroke(stroke)
+            self.selected = [stroke for stroke in self.selected if stroke not in hits]
+            self.invalidate_layer()
+
+    def selection_rect(self):
+        """Widget rectangle around the selected strokes, following a drag in progress"""
+        rect = QRectF()
+        for stroke in self.selected:
+            x0, y0, x1, y1 = stroke.bounds()
+            rect = rect.united(QRectF(self.page_view.map_from_page(stroke.page, x0, y0),
+                                      self.page_view.map_from_page(stroke.page, x1, y1)).normalized())
+        margin = max((self.pen_margin(stroke) for stroke in self.selected), default=0) + 2
+        return rect.adjusted(-margin, -margin, margin, margin).translated(self.move_offset)
+
+    def finish_select(self):
+        """Select the strokes inside the lasso or rectangle just drawn"""
+        page = self.select_page
+        if page < 0 or self.select_path.size() < 2:
+            self.selected = []
+            return
+        points = [self.page_view.map_to_page(page, point.toPoint()) for point in self.select_path]
+        if self.select_rect_mode:
+            xs = [x for x, _ in points]
+            ys = [y for _, y in points]
+            self.selected = self.annotations.strokes_in_rect(page, min(xs), min(ys), max(xs), max(ys))
+        else:
+            self.selected = self.annotations.strokes_in_polygon(page, points)
+
+    def keyPressEvent(self, event):
+        if self.selected and event.key() in (Qt.Key_Delete, Qt.Key_Backspace):
+            self.delete_selection()
+        elif event.key() == Qt.Key_Escape:
+            self.clear_selection()
+        else:
+            super().keyPressEvent(event)
 
     def set_pdf_rect(self, rect):
         """Set the rectangle that represents the PDF boundaries"""
         self.pdf_rect = rect
+        # Page positions may have moved
+        self.invalidate_layer()
+
+    def invalidate_layer(self):
+        """Rebuild the stroke layer on the next paint"""
+        self.layer = None
         self.update()
 
+    def set_page_view(self, page_view):
+        """Set the page view used to map drawing positions to pages"""
+        self.page_view = page_view
+
     def mousePressEvent(self, event):
-        if event.button() == Qt.LeftButton:
+        if event.button() != Qt.LeftButton or not self.page_view:
+            return
+        if self.tool == 'eraser':
+            self.erasing = True
+            self.erase_at(event.pos())
+        elif self.tool == 'select':
+            if self.selected and self.selection_rect().contains(QPointF(event.pos())):
+                # Drag the selection; its strokes are drawn live until dropped
+                self.move_start = QPointF(event.pos())
+                self.hidden_strokes = set(self.selected)
+                self.invalidate_layer()
+            else:
+                self.clear_selection()
+                self.select_page = self.page_view.page_at(event.pos())
+                self.select_rect_mode = bool(event.modifiers() & Qt.ShiftModifier)
+                self.select_path = QPolygonF([QPointF(event.pos())]) if self.select_page >= 0 else QPolygonF()
+        else:
+            # Strokes belong to the page they were started on
+            page = self.page_view.page_at(event.pos())
+            if page < 0:
+                return
             self.drawing = True
-            self.last_point = event.pos()
+            style = self.annotations.style_index(self.current_color.getRgb(), self.line_width)
+            self.current_stroke = self.annotations.begin_stroke(page, style)
+            self.current_stroke.add_point(*self.page_view.map_to_page(page, event.pos()))
+            self.live_polygon = QPolygonF([QPointF(event.pos())])
 
     def mouseMoveEvent(self, event):
-        if self.drawing:
-            current_point = event.pos()
-            self.annotations.append({
-                'start': self.last_point,
-                'end': current_point,
-                'color': self.current_color,
-                'width': self.line_width
-            })
-            self.last_point = current_point
+        if self.erasing:
+            self.erase_at(event.pos())
+        elif self.move_start is not None:
+            old = self.selection_rect().toAlignedRect()
+            self.move_offset = QPointF(event.pos()) - self.move_start
+            self.update(old.united(self.selection_rect().toAlignedRect()))
+        elif self.select_path.size():
+            if self.select_rect_mode:
+                self.select_path = QPolygonF([self.select_path.first(), QPointF(event.pos())])
+            else:
+                self.select_path.append(QPointF(event.pos()))
             self.update()
+        elif self.drawing:
+            stroke = self.current_stroke
+            stroke.add_point(*self.page_view.map_to_page(stroke.page, event.pos()))
+            last = self.live_polygon.last()
+            self.live_polygon.append(QPointF(event.pos()))
+            # Only repaint around the new segment
+            self.update(self.segment_rect(last, QPointF(event.pos()), stroke))
 
     def mouseReleaseEvent(self, event):
-        if event.button() == Qt.LeftButton:
+        if event.button() != Qt.LeftButton:
+            return
+        if self.erasing:
+            self.erasing = False
+        elif self.move_start is not None:
+            page = self.selected[0].page
+            x0, y0 = self.page_view.map_to_page(page, self.move_start.toPoint())
+            x1, y1 = self.page_view.map_to_page(page, event.pos())
+            self.annotations.move_strokes(self.selected, x1 - x0, y1 - y0)
+            self.move_start = None
+            self.move_offset = QPointF()
+            self.hidden_strokes = set()
+            self.invalidate_layer()
+        elif self.select_path.size():
+            self.finish_select()
+            self.select_path = QPolygonF()
+            self.update()
+        elif self.drawing:
             self.drawing = False
+            stroke = self.current_stroke
+            self.current_stroke = None
+            margin = self.pen_margin(stroke)
+            if len(stroke) < 2:
+                # A click without movement draws nothing
+                self.annotations.remove_stroke(stroke)
+            else:
+                # Keep only the points that change the stroke's shape at this zoom
+                stroke.simplify(self.simplify_tolerance / self.page_view.scale)
+                self.annotations.finish_stroke(stroke)
+                if self.layer is not None:
+                    # Commit the finished stroke into the layer
+                    painter = QPainter(self.layer)
+                    painter.setRenderHint(QPainter.Antialiasing)
+                    painter.translate(-self.layer_rect.topLeft())
+                    self.draw_stroke(painter, stroke)
+                    painter.end()
+            self.update(self.live_polygon.boundingRect().toAlignedRect().adjusted(-margin, -margin, margin, margin))
+            self.live_polygon = QPolygonF()
+
+    def pen_margin(self, stroke):
+        """Pixels a stroke's pen reaches beyond its points"""
+        return int(self.annotations.styles[stroke.style].width * self.page_view.scale / 2) + 2
+
+    def segment_rect(self, start, end, stroke):
+        margin = self.pen_margin(stroke)
+        return QRect(start.toPoint(), end.toPoint()).normalized().adjusted(-margin, -margin, margin, margin)
 
+    def pen_for(self, style_index):
+        pen = self.pens.get(style_index)
+        if pen is None:
+            style = self.annotations.styles[style_index]
+            pen = QPen(QColor(*style.color), style.width * self.page_view.scale,
+                       Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
+            self.pens[style_index] = pen
+        return pen
+
+    def draw_stroke(self, painter, stroke):
+        painter.setPen(self.pen_for(stroke.style))
+        painter.drawPolyline(QPolygonF([self.page_view.map_from_page(stroke.page, x, y)
+                                        for x, y in stroke.iter_points()]))
+
+    def build_layer(self, exposed):
+        """Rasterize the committed strokes around the viewport into the layer"""
+        visible = self.visibleRegion().boundingRect().united(exposed)
+        margin = visible.height() // 2
+        rect = visible.adjusted(-margin, -margin, margin, margin).intersected(self.rect())
+        if self.layer_scale != self.page_view.scale:
+            self.pens.clear()
+        self.layer_scale = self.page_view.scale
+        self.layer_rect = rect
+        self.layer = QImage(rect.size(), QImage.Format_ARGB32_Premultiplied)
+        self.layer.fill(Qt.transparent)
+
+        painter = QPainter(self.layer)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.translate(-rect.topLeft())
+        for page in self.page_view.pages_in_range(rect.top(), rect.bottom()):
+            for stroke in self.annotations.strokes_on_page(page):
+                if stroke is not self.current_stroke and stroke not in self.hidden_strokes:
+                    self.draw_stroke(painter, stroke)
+        painter.end()
+
+    @metrics.timed('annotator.paint')
     def paintEvent(self, event):
-        if not self.pdf_rect:
+        if not self.pdf_rect or not self.page_view:
             return
             
         painter = QPainter(self)
@@ -75,99 +302,42 @@ class PDFAnnotator(QWidget):
         # Set composition mode for proper overlay
         painter.setCompositionMode(QPainter.CompositionMode_SourceOver)
         
-        for annotation in self.annotations:
-            pen = QPen(annotation['color'], annotation['width'], Qt.SolidLine, Qt.RoundCap, Qt.RoundJoin)
-            painter.setPen(pen)
-            painter.drawLine(annotation['start'], annotation['end'])
+        exposed = event.rect()
+        if (self.layer is None or self.layer_scale != self.page_view.scale
+                or not self.layer_rect.contains(exposed)):
+            self.build_layer(exposed)
+        painter.drawImage(exposed, self.layer, exposed.translated(-self.layer_rect.topLeft()))
+
+        # The live stroke goes on top of the layer
+        if self.current_stroke is not None:
+            painter.setPen(self.pen_for(self.current_stroke.style))
+            painter.drawPolyline(self.live_polygon)
 
-    def normalize_color(self, color):
-        """Convert RGB values from 0-255 to 0-1 range"""
-        r, g, b, _ = color.getRgb()
-        return (r / 255.0, g / 255.0, b / 255.0)
+        if self.hidden_strokes:
+            painter.save()
+            painter.translate(self.move_offset)
+            for stroke in self.hidden_strokes:
+                self.draw_stroke(painter, stroke)
+            painter.restore()
+        if self.selected:
+            painter.setPen(QPen(QColor(0, 120, 215), 1, Qt.DashLine))
+            painter.setBrush(Qt.NoBrush)
+            painter.drawRect(self.selection_rect())
+        if self.select_path.size():
+            painter.setPen(QPen(QColor(0, 120, 215), 1, Qt.DashLine))
+            painter.setBrush(QColor(0, 120, 215, 30))
+            if self.select_rect_mode:
+                painter.drawRect(QRectF(self.select_path.first(), self.select_path.last()).normalized())
+            else:
+                painter.drawPolygon(self.select_path)
 
+    @metrics.timed('annotator.save_annotations')
     def save_annotations(self, pdf_path, output_path):
+        from .saver import save_document  # Imports PyMuPDF, which startup does without
         try:
-            if not self.pdf_rect:
-                return False
-
-            # Create a temporary file
-            temp_fd, temp_path = tempfile.mkstemp(suffix='.pdf')
-            os.close(temp_fd)  # Close the file descriptor
-
-            try:
-                # Copy original file to temp location first
-                shutil.copy2(pdf_path, temp_path)
-                
-                # Small delay to ensure file operations are complete
-                time.sleep(0.1)
-                
-                # Open the temporary file and modify it
-                doc = fitz.open(temp_path)
-                page = doc[0]  # Currently working with first page only
-                
-                # Calculate scaling factors
-                scale_x = page.rect.width / self.pdf_rect.width()
-                scale_y = page.rect.height / self.pdf_rect.height()
-                
-                for annotation in self.annotations:
-                    # Convert Qt coordinates to PDF coordinates
-                    start = annotation['start']
-                    end = annotation['end']
-                    
-                    # Adjust coordinates relative to PDF rectangle
-                    start_x = (start.x() - self.pdf_rect.left()) * scale_x
-                    start_y = (start.y() - self.pdf_rect.top()) * scale_y
-                    end_x = (end.x() - self.pdf_rect.left()) * scale_x
-                    end_y = (end.y() - self.pdf_rect.top()) * scale_y
-                    
-                    # Normalize color values to 0-1 range
-                    normalized_color = self.normalize_color(annotation['color'])
-                    
-                    # Create annotation on PDF
-                    page.draw_line(
-                        (start_x, start_y),
-                        (end_x, end_y),
-                        color=normalized_color,
-                        width=annotation['width']
-                    )
-                
-                # Save to a second temporary file
-                final_temp_fd, final_temp_path = tempfile.mkstemp(suffix='.pdf')
-                os.close(final_temp_fd)
-                doc.save(final_temp_path)
-                doc.close()
-
-                # Small delay to ensure file operations are complete
-                time.sleep(0.1)
-
-                # If the output path exists, try to remove it
-                try:
-                    if os.path.exists(output_path):
-                        os.remove(output_path)
-                except Exception:
-                    time.sleep(0.2)  # Wait a bit longer if file is still locked
-                    if os.path.exists(output_path):
-                        os.remove(output_path)
-
-                # Move temporary file to final destination
-                shutil.move(final_temp_path, output_path)
-                
-                # Clean up the first temporary file
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
-                
-                return True
-
-            except Exception as e:
-                # Clean up temporary files in case of error
-                for path in [temp_path, final_temp_path]:
-                    if os.path.exists(path):
-                        try:
-                            os.remove(path)
-                        except Exception:
-                            pass
-                raise e
-
+            # The time taken is recorded by the metrics decorator
+            save_document(pdf_path, output_path, self.annotations, flatten=self.flatten)
+            return True
         except Exception as e:
             print(f"Error saving annotations: {str(e)}")
             return False
@@ -0,0 +1,96 @@
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import multiprocessing
+import queue
+import time
+
+from .metrics import metrics
+
+class BackgroundSave(QObject):
+    """
+    Runs one save in a worker process while the GUI stays responsive.
+
+    PyMuPDF holds the GIL while it writes, so a thread would still freeze the
+    window on large files. The strokes are pickled into the worker when the
+    save starts, so they are a snapshot: the user can keep annotating and
+    later strokes are not part of this save. Progress and the outcome come
+    back over a queue that is polled on the GUI thread.
+
+    Before a rewritten file replaces the open source, releaseRequested is
+    emitted; its receivers must close the file before returning and leave
+    it closed until the save is over (see released).
+    """
+    progress = pyqtSignal(int, int)  # steps done, total steps
+    releaseRequested = pyqtSignal()
+    finished = pyqtSignal(str)  # timing summary
+    failed = pyqtSignal(str)  # error message
+    cancelled = pyqtSignal()
+
+    def __init__(self, source_path, output_path, strokes=None, flatten=False, parent=None):
+        super().__init__(parent)
+        self.source_path = source_path
+        self.output_path = output_path
+        from . import saver  # Imports PyMuPDF, which is not needed before the first save
+        context = multiprocessing.get_context("spawn")
+        self.messages = context.Queue()
+        self.cancel_event = context.Event()
+        self.released_event = context.Event()
+        self.released = False  # Whether the GUI let go of the source for the worker to replace it
+        self.process = context.Process(
+            target=saver.save_in_worker,
+            args=(source_path, output_path, strokes, flatten, self.messages, self.cancel_event,
+                  self.released_event),
+            daemon=True)
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(50)
+        self.poll_timer.timeout.connect(self.poll)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self.process.start()
+        self.poll_timer.start()
+
+    def cancel(self):
+        """Ask the worker to stop; a save that is already writing still completes"""
+        self.cancel_event.set()
+
+    def is_running(self):
+        return self.poll_timer.isActive()
+
+    def poll(self):
+        if self.read_messages():
+            return
+        if not self.process.is_alive():
+            # It may have reported its outcome between the read above and exiting
+            if self.read_messages():
+                return
+            # Exited without reporting back, e.g. killed or crashed in MuPDF
+            self.stop()
+            self.failed.emit(f"Save process exited with code {self.process.exitcode}")
+
+    def read_messages(self):
+        """Handle what the worker reported so far; returns whether that included the outcome"""
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                return False
+            if message[0] == 'progress':
+                self.progress.emit(message[1], message[2])
+            elif message[0] == 'release':
+                self.releaseRequested.emit()
+                self.released = True
+                self.released_event.set()
+            else:
+                self.stop()
+                if message[0] == 'done':
+                    metrics.record('save.background', time.perf_counter() - self.started)
+                    self.finished.emit(message[1])
+                elif message[0] == 'cancelled':
+                    self.cancelled.emit()
+                else:
+                    self.failed.emit(message[1])
+                return True
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.process.join(1)
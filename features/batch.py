@@ -0,0 +1,232 @@
+"""
+Apply the same stamps and strokes to many PDFs across all CPU cores.
+
+Nothing here imports Qt, so batches run on machines without a display and
+worker processes start quickly.
+
+The spec is a JSON file such as:
+
+    {
+        "stamps": [
+            {"text": "CONFIDENTIAL", "fontsize": 60, "color": [255, 0, 0],
+             "opacity": 0.25, "rotate": 45, "position": "center"},
+            {"image": "logo.png", "rect": [20, 20, 120, 60], "pages": [0]}
+        ],
+        "strokes": [
+            {"page": 0, "color": [0, 0, 255, 255], "width": 2,
+             "points": [[72, 72], [200, 90], [300, 72]]}
+        ],
+        "flatten": false
+    }
+
+Stamp positions and rectangles are PDF points on the page as displayed;
+stroke points are PDF points on the unrotated page, as PDFAnnotator stores
+them. A stamp's "rotate" turns it counterclockwise in degrees and its
+"pages" is a list of page indexes, negative counting from the end; without
+it the stamp goes on every page.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import argparse
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from .saver import save_document
+from .strokes import StrokeStore, pdf_color
+
+class StampSpec:
+    """Stamps and strokes to apply to every document of a batch"""
+    def __init__(self, stamps=(), strokes=None, flatten=False, base_dir=""):
+        self.stamps = list(stamps)
+        self.strokes = strokes or StrokeStore()
+        self.flatten = flatten
+        self.base_dir = base_dir  # Image paths are relative to the spec file
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        strokes = StrokeStore()
+        for item in data.get("strokes", []):
+            color = list(item.get("color", (255, 0, 0)))
+            if len(color) == 3:
+                color.append(255)
+            stroke = strokes.begin_stroke(item["page"], strokes.style_index(color, item.get("width", 2)))
+            for x, y in item["points"]:
+                stroke.add_point(x, y)
+        return cls(data.get("stamps", []), strokes, data.get("flatten", False),
+                   os.path.dirname(os.path.abspath(path)))
+
+    def pages(self, stamp, page_count):
+        numbers = stamp.get("pages")
+        if numbers is None:
+            return range(page_count)
+        return [n % page_count for n in numbers if -page_count <= n < page_count]
+
+    def apply(self, doc):
+        """Add the stamps to an open document; strokes are written by save_document"""
+        image_xrefs = {}  # Image path -> xref, so each image is embedded once
+        for stamp in self.stamps:
+            for number in self.pages(stamp, doc.page_count):
+                page = doc[number]
+                if "image" in stamp:
+                    self.apply_image(page, stamp, image_xrefs)
+                else:
+                    self.apply_text(page, stamp)
+
+    def apply_text(self, page, stamp):
+        fontsize = stamp.get("fontsize", 48)
+        text = stamp["text"]
+        width = fitz.get_text_length(text, fontname="helv", fontsize=fontsize)
+        position = stamp.get("position", "center")
+        rect = page.rect  # Positions are taken on the page as displayed
+        if position == "center":
+            center = fitz.Point((rect.x0 + rect.x1) / 2, (rect.y0 + rect.y1) / 2)
+        else:
+            center = fitz.Point(position)
+        # Text is laid out on the unrotated page, then turned about its center
+        # so it shows at the requested angle (counterclockwise) once the page
+        # rotation is applied
+        center = center * page.derotation_matrix
+        origin = center + (-width / 2, fontsize / 3)
+        angle = stamp.get("rotate", 0) + page.rotation
+        page.insert_text(origin, text, fontsize=fontsize, fontname="helv",
+                         color=pdf_color(stamp.get("color", (255, 0, 0))),
+                         fill_opacity=stamp.get("opacity", 1.0),
+                         morph=(center, fitz.Matrix(angle)) if angle % 360 else None,
+                         overlay=stamp.get("overlay", True))
+
+    def apply_image(self, page, stamp, image_xrefs):
+        path = os.path.join(self.base_dir, stamp["image"])
+        rect = fitz.Rect(stamp.get("rect", page.rect)) * page.derotation_matrix
+        xref = image_xrefs.get(path, 0)
+        if xref:
+            page.insert_image(rect, xref=xref, overlay=stamp.get("overlay", True))
+        else:
+            image_xrefs[path] = page.insert_image(rect, filename=path, overlay=stamp.get("overlay", True))
+
+# Spec of the batch, loaded once per worker process
+_spec = None
+
+def init_worker(spec_path):
+    global _spec
+    _spec = StampSpec.load(spec_path)
+
+def process_file(source_path, output_path):
+    """Stamp one file; returns (source, output, seconds, pages, bytes, error)"""
+    start = time.perf_counter()
+    page_counts = []
+
+    def edit(doc):
+        page_counts.append(doc.page_count)
+        _spec.apply(doc)
+
+    try:
+        save_document(source_path, output_path, _spec.strokes, flatten=_spec.flatten, edit=edit)
+        return source_path, output_path, time.perf_counter() - start, page_counts[0], os.path.getsize(source_path), None
+    except Exception as e:
+        return source_path, output_path, time.perf_counter() - start, 0, 0, str(e)
+
+def expand_inputs(patterns, list_file=None):
+    """Paths matching the glob patterns (and listed in list_file), without duplicates"""
+    if list_file:
+        with open(list_file, encoding="utf-8") as f:
+            patterns = list(patterns) + [line.strip() for line in f if line.strip()]
+    paths = {}
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        for path in sorted(matches):
+            paths.setdefault(os.path.abspath(path), None)
+    return list(paths)
+
+def common_root(paths):
+    """Deepest folder containing every path, or None if they share none (e.g. other drives)"""
+    try:
+        return os.path.commonpath([os.path.dirname(path) for path in paths]) if paths else None
+    except ValueError:
+        return None
+
+def output_path_for(path, output_dir=None, suffix="_stamped", in_place=False, root=None):
+    """
+    Where the result for path goes. Under output_dir it keeps its path
+    relative to root, the common folder of the inputs, so inputs with the
+    same name in different folders do not overwrite each other.
+    """
+    if in_place:
+        return path
+    if output_dir:
+        relative = os.path.relpath(path, root) if root else os.path.basename(path)
+        return os.path.join(output_dir, relative)
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(os.path.dirname(path), stem + suffix + ext)
+
+def output_paths(paths, output_dir=None, suffix="_stamped", in_place=False):
+    """(path, output path) of every input, and the inputs left out because another has the same output"""
+    root = common_root(paths) if output_dir else None
+    targets = {}
+    for path in paths:
+        output = output_path_for(path, output_dir, suffix, in_place, root)
+        targets.setdefault(os.path.normcase(os.path.abspath(output)), []).append((path, output))
+    jobs = []
+    clashes = []
+    for pairs in targets.values():
+        jobs.append(pairs[0])
+        clashes.extend(pairs[1:])
+    return jobs, clashes
+
+def run(paths, spec_path, output_dir=None, suffix="_stamped", in_place=False, workers=None, out=sys.stdout):
+    """Process paths across a pool of workers; returns the number of failures"""
+    StampSpec.load(spec_path)  # Fail early on a broken spec
+    jobs, clashes = output_paths(paths, output_dir, suffix, in_place)
+    for _, output in jobs:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+    done = pages = size = 0
+    failed = len(clashes)
+    for path, output in clashes:
+        print(f"FAILED {path}: {output} is also the output of another input", file=out)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(jobs))), mp_context=context,
+                             initializer=init_worker, initargs=(spec_path,)) as executor:
+        futures = [executor.submit(process_file, path, output) for path, output in jobs]
+        for future in as_completed(futures):
+            source, output, seconds, page_count, file_size, error = future.result()
+            if error:
+                failed += 1
+                print(f"FAILED {source}: {error}", file=out)
+                continue
+            done += 1
+            pages += page_count
+            size += file_size
+            print(f"{seconds * 1000:8.0f} ms  {page_count:5d} pages  {source} -> {output}", file=out)
+
+    elapsed = time.perf_counter() - start
+    rate = elapsed or 1e-9
+    print(f"{done} files ({pages} pages, {size / 1e6:.1f} MB) in {elapsed:.2f} s with {workers} workers: "
+          f"{done / rate:.1f} files/s, {pages / rate:.1f} pages/s, {size / 1e6 / rate:.1f} MB/s"
+          + (f"; {failed} failed" if failed else ""), file=out)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stamp and annotate PDFs in bulk without the GUI.")
+    parser.add_argument("spec", help="JSON file with the stamps and strokes to apply")
+    parser.add_argument("inputs", nargs="*", help="PDF files or glob patterns (quote them, ** recurses)")
+    parser.add_argument("--list", dest="list_file", help="file with one input path per line")
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument("-o", "--output-dir", help="write results here under their paths relative to the inputs' common folder")
+    output.add_argument("--suffix", default="_stamped", help="suffix for results written next to the inputs")
+    output.add_argument("--in-place", action="store_true", help="modify the inputs (saved incrementally)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.inputs, args.list_file)
+    if not paths:
+        parser.error("no input files")
+    failed = run(paths, args.spec, args.output_dir, args.suffix, args.in_place, args.workers)
+    return 1 if failed else 0
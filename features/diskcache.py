@@ -0,0 +1,158 @@
+# Rendered pages kept on disk between sessions. Nothing here imports Qt, so
+# render workers read and write the cache themselves.
+import hashlib
+import os
+import struct
+import zlib
+
+import fitz  # PyMuPDF
+
+# Bump when rendering changes in a way that makes cached renders wrong
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHIII')  # Magic, version, components, width, height, stride
+MAGIC = b'PDFR'
+
+_fingerprints = {}  # (path, mtime_ns, size) -> fingerprint
+
+def file_fingerprint(path, sample_bytes=1024 * 1024):
+    """
+    Content fingerprint of a PDF: a hash of its size and its first and last
+    megabyte.
+
+    Unlike path and mtime it survives copying and renaming, and any edit
+    saved by PyMuPDF (incremental or not) changes the end of the file.
+    """
+    stat = os.stat(path)
+    file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    fingerprint = _fingerprints.get(file_key)
+    if fingerprint is None:
+        digest = hashlib.sha1(str(stat.st_size).encode('ascii'))
+        with open(path, 'rb') as f:
+            digest.update(f.read(sample_bytes))
+            if stat.st_size > sample_bytes:
+                f.seek(max(sample_bytes, stat.st_size - sample_bytes))
+                digest.update(f.read(sample_bytes))
+        fingerprint = _fingerprints[file_key] = digest.hexdigest()
+    return fingerprint
+
+class DiskRenderCache:
+    """
+    Renders stored as zlib-compressed RGB files with LRU eviction.
+
+    Compression uses the fastest level: pages are mostly flat areas, which
+    squeeze well even so, and writing must not add noticeably to a render.
+    A hit refreshes the file's mtime, and eviction removes the files with
+    the oldest mtimes once the directory outgrows max_bytes. Several
+    processes may share a directory; files are written under a temporary
+    name and renamed, and one that vanishes while being read is a miss.
+    """
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, evict_every=32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evict_every = evict_every  # Writes between size checks of the directory
+        self.writes = 0
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def make_key(fingerprint, page, scale, clip=None):
+        text = f"{FORMAT_VERSION}|{fingerprint}|{page}|{scale:.4f}|{clip}"
+        return hashlib.sha1(text.encode('ascii')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key[:2], key + '.pdfr')
+
+    def get(self, key):
+        """The cached fitz.Pixmap for key, or None"""
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)
+        except OSError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, components, width, height, stride = HEADER.unpack_from(data)
+        if magic != MAGIC or version != FORMAT_VERSION or components != 3:
+            return None
+        try:
+            samples = zlib.decompress(data[HEADER.size:])
+        except zlib.error:
+            return None
+        if len(samples) != stride * height:
+            return None
+        return fitz.Pixmap(fitz.csRGB, width, height, samples, False)
+
+    def put(self, key, pix):
+        """Store an RGB pixmap without alpha under key"""
+        if pix.n != 3 or pix.alpha:
+            return
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part_path = f"{path}.{os.getpid()}.part"
+        try:
+            with open(part_path, 'wb') as f:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, 3, pix.width, pix.height, pix.stride))
+                f.write(zlib.compress(pix.samples_mv, 1))
+            os.replace(part_path, path)
+        except OSError:
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            return
+        self.writes += 1
+        if self.writes % self.evict_every == 0:
+            self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every cached file"""
+        found = []
+        for folder in os.scandir(self.directory):
+            if not folder.is_dir():
+                continue
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.pdfr'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    found.append((stat.st_mtime, stat.st_size, entry.path))
+        return found
+
+    def evict(self):
+        """Delete least recently used files until the cache is below 90% of max_bytes"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= target:
+                break
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+# Caches opened by this process, by directory
+_caches = {}
+
+def open_cache(directory, max_bytes):
+    """The DiskRenderCache of this process for directory"""
+    cache = _caches.get(directory)
+    if cache is None:
+        cache = _caches[directory] = DiskRenderCache(directory, max_bytes)
+    cache.max_bytes = max_bytes
+    return cache
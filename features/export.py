@@ -0,0 +1,166 @@
+"""
+Export pages of one or many PDFs as images across all CPU cores.
+
+Nothing here imports Qt. Pages are spread over worker processes, each
+keeping its own open documents (see rasterizer.open_session), and every
+worker writes its images straight to disk, so only file names and sizes
+travel back. At most a few pages per worker are in flight at any time, so
+memory use does not grow with the number of pages.
+"""
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+import fitz  # PyMuPDF
+
+from . import rasterizer
+from .batch import common_root, expand_inputs
+
+EXTENSIONS = {'png': '.png', 'jpeg': '.jpg', 'raw': '.rgb'}
+
+def parse_ranges(spec):
+    """
+    (first, last) 1-based page ranges of a spec like "1-3,7,10-", last being
+    None for an open end. Raises ValueError for anything else, including
+    reversed ranges and pages below 1.
+    """
+    ranges = []
+    for part in spec.split(','):
+        part = part.strip()
+        try:
+            if '-' in part:
+                first, last = part.split('-', 1)
+                first = int(first) if first.strip() else 1
+                last = int(last) if last.strip() else None
+            else:
+                first = last = int(part)
+        except ValueError:
+            raise ValueError(f"invalid page range {part!r}") from None
+        if first < 1 or (last is not None and last < first):
+            raise ValueError(f"invalid page range {part!r}")
+        ranges.append((first, last))
+    return ranges
+
+def parse_pages(spec, page_count):
+    """
+    Page indexes selected by a spec like "1-3,7,10-" (1-based, as printed on
+    screen). An empty spec selects every page. Raises ValueError for a bad
+    spec or a range starting or ending past the last page.
+    """
+    if not spec:
+        return list(range(page_count))
+    pages = []
+    for first, last in parse_ranges(spec):
+        if first > page_count or (last or 0) > page_count:
+            raise ValueError(f"pages {spec} are out of range, the document has {page_count} pages")
+        pages.extend(range(first - 1, last or page_count))
+    return sorted(set(pages))
+
+def output_name(path, page, format, output_dir, root=None):
+    """
+    Image path of a page. Under output_dir the input keeps its folder
+    relative to root, so inputs with the same name do not overwrite each other.
+    """
+    folder = os.path.dirname(os.path.relpath(path, root)) if root else ""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(output_dir, folder, f"{stem}-{page + 1:04d}{EXTENSIONS[format]}")
+
+def iter_jobs(paths, pages_spec, output_dir, format):
+    """
+    (path, page, output path) for every selected page, one document at a
+    time, or (path, None, error) for a document that cannot be exported
+    """
+    root = common_root(paths)
+    claimed = {}  # Output path of the first page -> input writing it
+    for path in paths:
+        try:
+            with fitz.open(path) as doc:
+                pages = parse_pages(pages_spec, doc.page_count)
+        except Exception as e:
+            yield path, None, str(e)
+            continue
+        if not pages:
+            continue
+        first = os.path.normcase(os.path.abspath(output_name(path, pages[0], format, output_dir, root)))
+        if claimed.setdefault(first, path) != path:
+            yield path, None, f"its images would overwrite those of {claimed[first]}"
+            continue
+        os.makedirs(os.path.dirname(first), exist_ok=True)
+        for page in pages:
+            yield path, page, output_name(path, page, format, output_dir, root)
+
+def run(paths, output_dir, dpi=150, format='png', quality=90, pages_spec=None,
+        workers=None, verbose=False, out=sys.stdout):
+    """Export the selected pages of paths; returns the number of failed pages"""
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2  # Keeps every worker busy without queueing every page
+    start = time.perf_counter()
+    done = failed = written = 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+        in_flight = {}  # Future -> (path, page, output path)
+
+        def collect(futures):
+            nonlocal done, failed, written
+            for future in futures:
+                path, page, output_path = in_flight.pop(future)
+                try:
+                    width, height, size = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"FAILED {path} page {page + 1}: {e}", file=out)
+                    continue
+                done += 1
+                written += size
+                if verbose:
+                    print(f"{width}x{height}  {output_path}", file=out)
+
+        for job in iter_jobs(paths, pages_spec, output_dir, format):
+            path, page, output_path = job
+            if page is None:
+                failed += 1
+                print(f"FAILED {path}: {output_path}", file=out)
+                continue
+            if len(in_flight) >= max_in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            future = executor.submit(rasterizer.render_page_to_file, path, page, dpi, output_path, format, quality)
+            in_flight[future] = job
+        collect(list(wait(in_flight).done))
+
+    elapsed = time.perf_counter() - start
+    rate = elapsed or 1e-9
+    print(f"{done} pages ({written / 1e6:.1f} MB) in {elapsed:.2f} s with {workers} workers: "
+          f"{done / rate:.1f} pages/s, {written / 1e6 / rate:.1f} MB/s"
+          + (f"; {failed} failed" if failed else ""), file=out)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render PDF pages to image files without the GUI.")
+    parser.add_argument("inputs", nargs="*", help="PDF files or glob patterns (quote them, ** recurses)")
+    parser.add_argument("-o", "--output-dir", required=True, help="directory for the images")
+    parser.add_argument("--list", dest="list_file", help="file with one input path per line")
+    parser.add_argument("--pages", help='pages to export, e.g. "1-3,7,10-" (default: all)')
+    parser.add_argument("--dpi", type=int, default=150)
+    parser.add_argument("-f", "--format", choices=sorted(EXTENSIONS), default="png",
+                        help="raw writes packed 8-bit RGB with no header")
+    parser.add_argument("--quality", type=int, default=90, help="JPEG quality")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: all cores)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every exported page")
+    args = parser.parse_args(argv)
+
+    if args.pages:
+        try:
+            parse_ranges(args.pages)
+        except ValueError as e:
+            parser.error(str(e))
+    paths = expand_inputs(args.inputs, args.list_file)
+    if not paths:
+        parser.error("no input files")
+    failed = run(paths, args.output_dir, args.dpi, args.format, args.quality, args.pages,
+                 args.workers, args.verbose)
+    return 1 if failed else 0
@@ -0,0 +1,128 @@
+from PyQt5.QtWidgets import QApplication, QWidget, QHBoxLayout, QLineEdit, QLabel, QToolButton, QStyle
+from PyQt5.QtCore import Qt, QTimer, pyqtSignal
+
+class FindBar(QWidget):
+    """
+    Search field with previous/next buttons and a hit counter.
+
+    Queries are run a moment after typing stops rather than per keystroke.
+    The bar only tracks hits and the current one; the viewer runs the
+    search and highlights the hits.
+    """
+    queryChanged = pyqtSignal(str)
+    currentHitChanged = pyqtSignal(int)  # index into hits, -1 for none
+    closed = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.hits = []
+        self.current = -1
+        self.progress_text = ""
+
+        layout = QHBoxLayout(self)
+        layout.setContentsMargins(4, 2, 4, 2)
+        self.query_edit = QLineEdit()
+        self.query_edit.setPlaceholderText("Find in document")
+        self.query_edit.setClearButtonEnabled(True)
+        self.query_edit.textChanged.connect(lambda: self.query_timer.start())
+        self.query_edit.returnPressed.connect(self.on_return_pressed)
+        layout.addWidget(self.query_edit)
+
+        self.previous_button = QToolButton()
+        self.previous_button.setIcon(self.style().standardIcon(QStyle.SP_ArrowUp))
+        self.previous_button.setToolTip("Previous match (Shift+Enter)")
+        self.previous_button.clicked.connect(self.find_previous)
+        layout.addWidget(self.previous_button)
+
+        self.next_button = QToolButton()
+        self.next_button.setIcon(self.style().standardIcon(QStyle.SP_ArrowDown))
+        self.next_button.setToolTip("Next match (Enter)")
+        self.next_button.clicked.connect(self.find_next)
+        layout.addWidget(self.next_button)
+
+        self.status_label = QLabel()
+        self.status_label.setMinimumWidth(160)
+        layout.addWidget(self.status_label)
+
+        close_button = QToolButton()
+        close_button.setIcon(self.style().standardIcon(QStyle.SP_DialogCloseButton))
+        close_button.setToolTip("Close (Esc)")
+        close_button.clicked.connect(self.close_bar)
+        layout.addWidget(close_button)
+
+        self.query_timer = QTimer(self)
+        self.query_timer.setSingleShot(True)
+        self.query_timer.setInterval(150)
+        self.query_timer.timeout.connect(lambda: self.queryChanged.emit(self.query_edit.text()))
+
+    def open_bar(self):
+        self.show()
+        self.query_edit.setFocus()
+        self.query_edit.selectAll()
+
+    def close_bar(self):
+        self.hide()
+        self.closed.emit()
+
+    def query(self):
+        return self.query_edit.text()
+
+    def set_hits(self, hits, keep_page=None):
+        """
+        Show new hits, keeping the current one on keep_page (or the first
+        hit after it) so results growing during indexing do not jump around.
+        currentHitChanged is only emitted when the current hit is a different one.
+        """
+        old_hit = self.current_hit()
+        self.hits = hits
+        current = -1
+        if hits:
+            current = 0
+            if keep_page is not None:
+                current = next((i for i, hit in enumerate(hits) if hit[0] >= keep_page), 0)
+        if old_hit is not None and current >= 0 and hits[current] == old_hit:
+            self.current = current
+            self.update_status()
+        else:
+            self.set_current(current)
+
+    def current_hit(self):
+        return self.hits[self.current] if 0 <= self.current < len(self.hits) else None
+
+    def set_progress(self, indexed, page_count):
+        self.progress_text = "" if indexed >= page_count else f" (indexed {indexed} of {page_count} pages)"
+        self.update_status()
+
+    def set_current(self, current):
+        self.current = current
+        self.update_status()
+        self.currentHitChanged.emit(current)
+
+    def update_status(self):
+        if not self.query().strip():
+            text = ""
+        elif not self.hits:
+            text = "No matches"
+        else:
+            text = f"{self.current + 1} of {len(self.hits)}"
+        self.status_label.setText(text + self.progress_text)
+
+    def find_next(self):
+        if self.hits:
+            self.set_current((self.current + 1) % len(self.hits))
+
+    def find_previous(self):
+        if self.hits:
+            self.set_current((self.current - 1) % len(self.hits))
+
+    def on_return_pressed(self):
+        if QApplication.keyboardModifiers() & Qt.ShiftModifier:
+            self.find_previous()
+        else:
+            self.find_next()
+
+    def keyPressEvent(self, event):
+        if event.key() == Qt.Key_Escape:
+            self.close_bar()
+        else:
+            super().keyPressEvent(event)
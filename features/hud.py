@@ -0,0 +1,51 @@
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPainter, QColor, QFont, QFontMetrics
+from PyQt5.QtCore import Qt, QTimer
+
+from .metrics import metrics
+
+class PerformanceHUD(QWidget):
+    """
+    Overlay listing the live metrics in a corner of its parent.
+
+    It ignores the mouse so it never gets in the way of drawing, and only
+    reads the registry on its refresh timer while it is shown.
+    """
+    def __init__(self, parent=None, interval=500):
+        super().__init__(parent)
+        self.lines = []
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)
+        self.setFont(QFont("monospace", 8))
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(interval)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.hide()
+
+    def set_enabled(self, enabled):
+        if enabled:
+            self.refresh()
+            self.show()
+            self.raise_()
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+            self.hide()
+
+    def refresh(self):
+        self.lines = metrics.summary_lines() or ["No measurements yet"]
+        font_metrics = QFontMetrics(self.font())
+        width = max(font_metrics.horizontalAdvance(line) for line in self.lines) + 16
+        height = font_metrics.lineSpacing() * len(self.lines) + 12
+        parent = self.parentWidget()
+        self.setGeometry(parent.width() - width - 10, 10, width, height)
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(0, 0, 0, 170))
+        painter.setPen(Qt.white)
+        font_metrics = painter.fontMetrics()
+        y = 6 + font_metrics.ascent()
+        for line in self.lines:
+            painter.drawText(8, y, line)
+            y += font_metrics.lineSpacing()
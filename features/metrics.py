@@ -0,0 +1,136 @@
+# In-process performance metrics. Nothing here imports Qt, so headless tools
+# and worker processes can record into the same kind of registry.
+from collections import deque
+import functools
+import json
+import time
+
+class Timing:
+    """Count, total and recent samples of one timed operation"""
+    __slots__ = ('count', 'total', 'samples')
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=max_samples)  # Recent durations in seconds
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    @staticmethod
+    def percentile(fraction, ordered):
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self):
+        ordered = sorted(self.samples)
+        return {
+            'count': self.count,
+            'total_ms': round(self.total * 1000, 3),
+            'p50_ms': round(Timing.percentile(0.5, ordered) * 1000, 3),
+            'p90_ms': round(Timing.percentile(0.9, ordered) * 1000, 3),
+            'p99_ms': round(Timing.percentile(0.99, ordered) * 1000, 3),
+            'max_ms': round(ordered[-1] * 1000, 3) if ordered else 0.0,
+        }
+
+class _Timer:
+    __slots__ = ('registry', 'name', 'start')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.registry.record(self.name, time.perf_counter() - self.start)
+
+class Metrics:
+    """
+    Timings, counters and gauges of the running application.
+
+    Recording a timing costs two perf_counter calls and a deque append, so
+    it is cheap enough for paint events. Percentiles are computed from the
+    most recent max_samples durations only when a snapshot is taken. Gauges
+    are callables (e.g. bytes held by a cache) evaluated at snapshot time,
+    so they cost nothing in between.
+    """
+    def __init__(self, max_samples=1024):
+        self.max_samples = max_samples
+        self.timings = {}
+        self.counters = {}
+        self.gauges = {}
+        self.started = time.perf_counter()
+
+    def record(self, name, seconds):
+        timing = self.timings.get(name)
+        if timing is None:
+            timing = self.timings[name] = Timing(self.max_samples)
+        timing.add(seconds)
+
+    def timer(self, name):
+        """Context manager recording the time spent in its block under name"""
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """Decorator recording every call of a function under name"""
+        def decorate(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    self.record(name, time.perf_counter() - start)
+            return wrapper
+        return decorate
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_gauge(self, name, function):
+        """Report function() under name in every snapshot"""
+        self.gauges[name] = function
+
+    def snapshot(self):
+        gauges = {}
+        for name, function in self.gauges.items():
+            try:
+                gauges[name] = function()
+            except Exception as e:
+                gauges[name] = f"error: {e}"
+        return {
+            'uptime_s': round(time.perf_counter() - self.started, 3),
+            'timings': {name: timing.snapshot() for name, timing in sorted(self.timings.items())},
+            'counters': dict(sorted(self.counters.items())),
+            'gauges': gauges,
+        }
+
+    def dump(self, path):
+        """Write a snapshot as JSON to path"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=2)
+            f.write("\n")
+
+    def summary_lines(self):
+        """Short human-readable lines for an overlay or a log"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, timing in snapshot['timings'].items():
+            lines.append(f"{name}: {timing['count']}x  p50 {timing['p50_ms']:.1f}  "
+                         f"p90 {timing['p90_ms']:.1f}  max {timing['max_ms']:.1f} ms")
+        for name, value in snapshot['counters'].items():
+            lines.append(f"{name}: {value}")
+        for name, value in snapshot['gauges'].items():
+            if isinstance(value, int) and name.endswith('bytes'):
+                value = f"{value / (1024 * 1024):.1f} MB"
+            lines.append(f"{name}: {value}")
+        return lines
+
+# Registry of this process
+metrics = Metrics()
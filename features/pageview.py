@@ -0,0 +1,592 @@
+from PyQt5.QtWidgets import QWidget
+from PyQt5.QtGui import QPainter, QColor, QPen
+from PyQt5.QtCore import Qt, QRect, QRectF, QPointF, QSize, QTimer, pyqtSignal
+import bisect
+import math
+import time
+
+from .metrics import metrics
+from .rendercache import RenderCache, document_id
+from .textlayer import TextLayer
+
+def rotate_point(x, y, rotation, width, height):
+    """Map unrotated page coordinates to a page displayed width x height points"""
+    if rotation == 90:
+        return width - y, x
+    if rotation == 180:
+        return width - x, height - y
+    if rotation == 270:
+        return y, height - x
+    return x, y
+
+def derotate_point(x, y, rotation, width, height):
+    """Inverse of rotate_point"""
+    if rotation == 90:
+        return y, width - x
+    if rotation == 180:
+        return width - x, height - y
+    if rotation == 270:
+        return height - y, x
+    return x, y
+
+class PDFPageView(QWidget):
+    """
+    Continuous vertical view of every page in a document.
+
+    Each page gets a placeholder of its zoomed size, but only the pages that
+    intersect the visible area (plus a margin) are rendered and kept in memory.
+    Pages too large to rasterize at once are rendered as fixed-size tiles,
+    and only the tiles covering the viewport are kept.
+
+    Pages are laid out at any zoom but only rasterized at a few render
+    levels, spaced levels_per_octave to a doubling of the scale: a zoom
+    change within the same level just draws the current renders scaled, and
+    renders are made again only when the zoom crosses into another level.
+    While zooming, pages are drawn from the nearest cached render scaled to
+    the new size until the sharp render arrives. During rapid zooming the
+    background renders are drafts without anti-aliasing, replaced by full
+    quality renders once zooming settles.
+
+    Dragging over the pages selects their text in reading order, and
+    Alt+dragging selects the words inside a rectangle. The words come from
+    a TextLayer, which extracts a page the first time it is pointed at.
+    """
+    layoutChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.session = None
+        self.scale = 2.0  # Pixels per PDF point (zoom factor * base resolution of 2)
+        self.levels_per_octave = 4
+        self.render_scale = 2.0  # Scale pages are rasterized at: scale snapped up to a render level
+        self.page_sizes = []  # (width, height) of each page in PDF points
+        self.page_rotations = []
+        self.page_offsets = []  # Top y coordinate of each page in widget pixels
+        self.images = {}  # (page index, tile or None) -> rendered QImage near the viewport
+        self.page_spacing = 10
+        self.margin = 10
+        self.render_margin = 1.0  # Extra viewport heights rendered above and below
+        self.tile_size = 512  # Edge of a square tile in pixels
+        self.tile_threshold = 8 * 1024 * 1024  # Pages with more pixels than this are tiled
+        self.message = "Open a PDF file to view."
+        self.image_provider = None  # Callable(page, display_list, scale) -> QImage, used without a renderer
+        self.renderer = None
+        self.render_cache = None
+        self.doc_id = None
+        self.draft_while_zooming = True
+        self.draft_slots = set()  # Slots showing a draft or stale render, to be re-rendered
+        self.zooming = False
+        self.shown_at = None  # perf_counter when a document or zoom level was set, until it is rendered
+        self.highlights = {}  # Page index -> [(x0, y0, x1, y1), ...] in unrotated PDF coordinates
+        self.current_highlight = None  # (page index, rects) drawn stronger than the others
+        self.text_layer = None  # TextLayer of the session, for selecting text
+        self.selection_anchor = None  # (page index, word index) where the selection started
+        self.selection_focus = None  # (page index, word index) where it ends
+        self.selection_box = None  # (page index, x0, y0, x1, y1) of an Alt+drag block selection
+        self.selecting = False
+        self.setMouseTracking(True)
+
+        # Coalesce scroll and resize notifications into a single render pass
+        self.visible_timer = QTimer(self)
+        self.visible_timer.setSingleShot(True)
+        self.visible_timer.setInterval(0)
+        self.visible_timer.timeout.connect(self.update_visible_pages)
+
+        # Zooming counts as settled once no zoom change came in for a while
+        self.zoom_settle_timer = QTimer(self)
+        self.zoom_settle_timer.setSingleShot(True)
+        self.zoom_settle_timer.setInterval(250)
+        self.zoom_settle_timer.timeout.connect(self.on_zoom_settled)
+
+    def set_renderer(self, renderer):
+        """Render pages in the background with the given PDFRenderer"""
+        self.renderer = renderer
+        renderer.pageRendered.connect(self.on_page_rendered)
+
+    def set_document(self, session):
+        """Show the document of a DocumentSession, replacing any previous one"""
+        self.session = session
+        self.images.clear()
+        self.highlights = {}
+        self.current_highlight = None
+        self.text_layer = TextLayer(session) if session else None
+        self.clear_selection()
+        self.page_sizes = []
+        self.page_rotations = []
+        self.doc_id = document_id(session.path) if session else None
+        self.shown_at = time.perf_counter()
+        if session:
+            for page in session.doc:
+                self.page_sizes.append((page.rect.width, page.rect.height))
+                self.page_rotations.append(page.rotation)
+        if self.renderer:
+            self.renderer.set_document(session.path if session else None)
+        self.relayout()
+
+    def reload_document(self):
+        """
+        Re-render after the session's file changed on disk, e.g. after saving
+        annotations into it. Current images stay on screen until their
+        replacements arrive, so the view does not flash.
+        """
+        if not self.session:
+            return
+        self.doc_id = document_id(self.session.path)
+        self.text_layer = TextLayer(self.session)
+        self.clear_selection()
+        if self.renderer:
+            # Also resumes rendering after release_document
+            self.renderer.set_document(self.session.path)
+        # Treat every shown image like a draft so it gets re-requested
+        self.draft_slots.update(self.images)
+        self.schedule_visible_update()
+
+    def release_document(self):
+        """
+        Stop reading the session's file until reload_document, e.g. while a
+        save replaces it. Shown images stay on screen.
+        """
+        self.text_layer = None
+        self.clear_selection()
+        if self.renderer:
+            self.renderer.set_document(None)
+
+    def set_message(self, text):
+        """Clear the view and show a message instead of pages"""
+        self.session = None
+        self.message = text
+        self.images.clear()
+        self.highlights = {}
+        self.current_highlight = None
+        self.text_layer = None
+        self.clear_selection()
+        self.page_sizes = []
+        self.page_rotations = []
+        self.doc_id = None
+        if self.renderer:
+            self.renderer.set_document(None)
+        self.relayout()
+
+    def render_level(self, scale):
+        """Smallest render level of at least scale"""
+        steps = self.levels_per_octave
+        # The tolerance keeps scales that are a level up to rounding on that level
+        return 2 ** (math.ceil(math.log2(scale) * steps - 1e-6) / steps)
+
+    def set_scale(self, scale):
+        """Set pixels per PDF point, dropping the renders if it moves to another render level"""
+        if scale == self.scale:
+            return
+        self.scale = scale
+        level = self.render_level(scale)
+        if level != self.render_scale:
+            self.render_scale = level
+            self.images.clear()
+            self.draft_slots.clear()
+            if self.renderer:
+                # Renders for the old level are stale now
+                self.renderer.cancel_all()
+            self.shown_at = time.perf_counter()
+            metrics.count('pageview.level_changes')
+        self.zooming = True
+        self.zoom_settle_timer.start()
+        self.relayout()
+
+    def on_zoom_settled(self):
+        """Replace draft renders with full quality ones"""
+        self.zooming = False
+        self.schedule_visible_update()
+        self.update()  # Scaled renders are drawn smoothly from now on
+
+    def page_count(self):
+        return len(self.page_sizes)
+
+    def page_size(self, index):
+        """Size of a page in widget pixels at the current scale"""
+        width, height = self.page_sizes[index]
+        return QSize(int(width * self.scale), int(height * self.scale))
+
+    def render_size(self, index):
+        """Size of a page in pixels at the render scale"""
+        width, height = self.page_sizes[index]
+        return QSize(int(width * self.render_scale), int(height * self.render_scale))
+
+    def page_rect(self, index):
+        """Rectangle of a page in widget coordinates"""
+        size = self.page_size(index)
+        x = max(self.margin, (self.width() - size.width()) // 2)
+        return QRect(x, self.page_offsets[index], size.width(), size.height())
+
+    def map_to_page(self, index, pos):
+        """Map a widget position to unrotated PDF coordinates on a page"""
+        rect = self.page_rect(index)
+        width, height = self.page_sizes[index]
+        x = (pos.x() - rect.left()) * width / rect.width()
+        y = (pos.y() - rect.top()) * height / rect.height()
+        return derotate_point(x, y, self.page_rotations[index], width, height)
+
+    def map_from_page(self, index, x, y):
+        """Map unrotated PDF coordinates on a page to a widget position"""
+        rect = self.page_rect(index)
+        width, height = self.page_sizes[index]
+        x, y = rotate_point(x, y, self.page_rotations[index], width, height)
+        return QPointF(rect.left() + x * rect.width() / width, rect.top() + y * rect.height() / height)
+
+    def page_at(self, pos):
+        """Index of the page under pos, or -1 if pos is not on a page"""
+        if not self.page_offsets:
+            return -1
+        index = bisect.bisect_right(self.page_offsets, pos.y()) - 1
+        if index >= 0 and self.page_rect(index).contains(pos):
+            return index
+        return -1
+
+    def pages_in_range(self, top, bottom):
+        """Indices of pages overlapping the vertical span top..bottom"""
+        if not self.page_offsets:
+            return range(0)
+        first = max(0, bisect.bisect_right(self.page_offsets, top) - 1)
+        last = bisect.bisect_right(self.page_offsets, bottom)
+        return range(first, min(last, len(self.page_offsets)))
+
+    def visible_rect(self):
+        """Part of the widget currently shown in the scroll area viewport"""
+        return self.visibleRegion().boundingRect()
+
+    def visible_pages(self):
+        rect = self.visible_rect()
+        return self.pages_in_range(rect.top(), rect.bottom())
+
+    def relayout(self):
+        """Recompute page positions and the widget size"""
+        self.page_offsets = []
+        y = self.margin
+        max_width = 0
+        for index in range(len(self.page_sizes)):
+            self.page_offsets.append(y)
+            size = self.page_size(index)
+            max_width = max(max_width, size.width())
+            y += size.height() + self.page_spacing
+
+        if self.page_sizes:
+            self.setMinimumSize(max_width + 2 * self.margin, y - self.page_spacing + self.margin)
+        else:
+            self.setMinimumSize(0, 0)
+        self.updateGeometry()
+        self.update()
+        self.schedule_visible_update()
+        self.layoutChanged.emit()
+
+    def schedule_visible_update(self):
+        self.visible_timer.start()
+
+    def update_visible_pages(self):
+        """Render pages near the viewport and release the images of the others"""
+        if not self.session or not self.page_sizes:
+            return
+
+        rect = self.visible_rect()
+        if rect.isEmpty():
+            return
+        extra = int(rect.height() * self.render_margin)
+        pages = self.pages_in_range(rect.top() - extra, rect.bottom() + extra)
+
+        # Tiled pages only keep the tiles around the viewport
+        tile_area = rect.adjusted(-self.tile_size, -self.tile_size, self.tile_size, self.tile_size)
+        wanted = []
+        for index in pages:
+            if self.is_tiled(index):
+                wanted.extend((index, tile) for tile in self.page_tiles(index, tile_area))
+            else:
+                wanted.append((index, None))
+        wanted_slots = set(wanted)
+
+        for slot in list(self.images):
+            if slot not in wanted_slots:
+                del self.images[slot]
+                self.draft_slots.discard(slot)
+        if self.renderer:
+            for slot in list(self.renderer.pending):
+                if slot not in wanted_slots:
+                    self.renderer.cancel(slot)
+
+        # Request the visible pages before the ones in the margin
+        visible = self.visible_pages()
+        for slot in sorted(wanted, key=lambda slot: slot[0] not in visible):
+            if self.renderer and self.renderer.is_pending(slot):
+                continue  # Already rendering at the current zoom
+            if slot not in self.images or (slot in self.draft_slots and not self.zooming):
+                self.render_slot(slot)
+
+    def is_tiled(self, index):
+        """Whether a page is too large at the current zoom to render in one piece"""
+        if not self.renderer:
+            return False
+        size = self.render_size(index)
+        return size.width() * size.height() > self.tile_threshold
+
+    def page_tiles(self, index, area):
+        """(column, row) of every tile of a page overlapping area"""
+        rect = self.page_rect(index)
+        local = area.intersected(rect).translated(-rect.topLeft())
+        if local.isEmpty():
+            return []
+        # Tiles are cut from the page at the render scale
+        tile = self.tile_size * self.scale / self.render_scale
+        return [(col, row)
+                for row in range(int(local.top() // tile), int(local.bottom() // tile) + 1)
+                for col in range(int(local.left() // tile), int(local.right() // tile) + 1)]
+
+    def tile_clip(self, index, tile):
+        """Pixel rectangle (x0, y0, x1, y1) of a tile within its page at the render scale"""
+        size = self.render_size(index)
+        x0 = tile[0] * self.tile_size
+        y0 = tile[1] * self.tile_size
+        return (x0, y0, min(x0 + self.tile_size, size.width()), min(y0 + self.tile_size, size.height()))
+
+    def slot_rect(self, slot):
+        """Widget rectangle covered by a whole page or one of its tiles"""
+        index, tile = slot
+        rect = QRectF(self.page_rect(index))
+        if tile is None:
+            return rect
+        x0, y0, x1, y1 = self.tile_clip(index, tile)
+        ratio = self.scale / self.render_scale
+        return QRectF(rect.left() + x0 * ratio, rect.top() + y0 * ratio, (x1 - x0) * ratio, (y1 - y0) * ratio)
+
+    def cache_key(self, slot, scale=None):
+        scale = self.render_scale if scale is None else scale
+        index, tile = slot
+        return RenderCache.make_key(self.doc_id, index, scale, self.page_rotations[index], tile)
+
+    def render_slot(self, slot):
+        if self.renderer:
+            cached = self.render_cache.get(self.cache_key(slot)) if self.render_cache else None
+            if cached is not None:
+                self.images[slot] = cached
+                self.draft_slots.discard(slot)
+                self.mark_shown()
+                self.update(self.slot_rect(slot).toAlignedRect())
+            else:
+                index, tile = slot
+                if tile is not None:
+                    clip = self.tile_clip(index, tile)
+                    size = (clip[2] - clip[0], clip[3] - clip[1])
+                else:
+                    clip = None
+                    size = self.render_size(index)
+                    size = (size.width(), size.height())
+                draft = self.draft_while_zooming and self.zooming
+                self.renderer.render(slot, self.render_scale, size, clip, draft)
+            return
+        # Synchronous fallback; the image provider does its own caching
+        index = slot[0]
+        self.images[slot] = self.image_provider(self.session.page(index), self.session.display_list(index),
+                                                self.render_scale)
+        self.update(self.slot_rect(slot).toAlignedRect())
+
+    def on_page_rendered(self, slot, scale, draft, image):
+        """Show a page or tile that finished rendering in the background"""
+        if slot[0] >= len(self.page_sizes):
+            return
+        # Keep the image as delivered; it wraps the worker's buffer without a copy
+        if self.render_cache and not draft:
+            self.render_cache.put(self.cache_key(slot, scale), image)
+        if scale != self.render_scale:
+            return
+        self.images[slot] = image
+        if draft:
+            self.draft_slots.add(slot)
+            if not self.zooming:
+                self.schedule_visible_update()  # Zooming settled while the draft rendered
+        else:
+            self.draft_slots.discard(slot)
+            self.mark_shown()
+        self.update(self.slot_rect(slot).toAlignedRect())
+
+    def mark_shown(self):
+        """Record how long the first sharp render after opening or zooming took"""
+        if self.shown_at is not None:
+            metrics.record('pageview.first_sharp_render', time.perf_counter() - self.shown_at)
+            self.shown_at = None
+
+    def draw_preview(self, painter, index, rect, exposed):
+        """
+        Draw the nearest cached render of a page scaled to its current size.
+        Returns False if there is nothing cached to draw.
+        """
+        if not self.render_cache:
+            return False
+        found = self.render_cache.nearest(self.doc_id, index, self.scale, self.page_rotations[index])
+        if not found:
+            return False
+        zoom, image = found
+        part = rect.intersected(exposed)
+        ratio = zoom / self.scale
+        source = QRectF((part.left() - rect.left()) * ratio, (part.top() - rect.top()) * ratio,
+                        part.width() * ratio, part.height() * ratio)
+        painter.drawImage(QRectF(part), image, source)
+        return True
+
+    def set_highlights(self, hits, current=None):
+        """Highlight search hits, (page index, rects) each, and current among them"""
+        self.highlights = {}
+        for page, rects in hits:
+            self.highlights.setdefault(page, []).extend(rects)
+        self.current_highlight = current
+        self.update()
+
+    def highlight_rect(self, index, rect):
+        """Widget rectangle of a rectangle in unrotated PDF coordinates"""
+        x0, y0, x1, y1 = rect
+        return QRectF(self.map_from_page(index, x0, y0), self.map_from_page(index, x1, y1)).normalized()
+
+    def draw_highlights(self, painter, index):
+        rects = self.highlights.get(index)
+        if rects:
+            painter.save()
+            painter.setCompositionMode(QPainter.CompositionMode_Multiply)
+            for rect in rects:
+                painter.fillRect(self.highlight_rect(index, rect), QColor(255, 235, 0))
+            if self.current_highlight and self.current_highlight[0] == index:
+                for rect in self.current_highlight[1]:
+                    painter.fillRect(self.highlight_rect(index, rect), QColor(255, 150, 0))
+            painter.restore()
+
+    def clear_selection(self):
+        had_selection = self.selection_anchor is not None or self.selection_box is not None
+        self.selection_anchor = self.selection_focus = self.selection_box = None
+        self.selecting = False
+        if had_selection:
+            self.update()
+
+    def word_near(self, pos, nearest=True):
+        """(page index, word index) of the word at (or nearest to) a widget position, or None"""
+        index = self.page_at(pos)
+        if index < 0 or not self.text_layer:
+            return None
+        x, y = self.map_to_page(index, pos)
+        page_text = self.text_layer.page(index)
+        word = page_text.nearest_word(x, y) if nearest else page_text.word_at(x, y)
+        return (index, word) if word >= 0 else None
+
+    def selected_ranges(self, pages=None):
+        """(page index, word indices) of every page with selected words, or only of those in pages"""
+        if self.selection_box is not None:
+            index, x0, y0, x1, y1 = self.selection_box
+            words = self.text_layer.page(index).words_in_rect(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+            return [(index, words)] if words else []
+        if self.selection_anchor is None:
+            return []
+        start, end = sorted((self.selection_anchor, self.selection_focus))
+        ranges = []
+        for index in range(start[0], end[0] + 1):
+            if pages is not None and index not in pages:
+                continue
+            first = start[1] if index == start[0] else 0
+            last = end[1] if index == end[0] else len(self.text_layer.page(index).words) - 1
+            if last >= first:
+                ranges.append((index, range(first, last + 1)))
+        return ranges
+
+    def selected_text(self):
+        return "\n".join(self.text_layer.page(index).text(words) for index, words in self.selected_ranges())
+
+    def mousePressEvent(self, event):
+        if event.button() != Qt.LeftButton or not self.text_layer:
+            return super().mousePressEvent(event)
+        self.clear_selection()
+        pos = event.pos()
+        index = self.page_at(pos)
+        if index >= 0 and event.modifiers() & Qt.AltModifier:
+            x, y = self.map_to_page(index, pos)
+            self.selection_box = (index, x, y, x, y)
+            self.selecting = True
+        else:
+            word = self.word_near(pos)
+            if word is not None:
+                self.selection_anchor = self.selection_focus = word
+                self.selecting = True
+                self.update()
+
+    def mouseMoveEvent(self, event):
+        pos = event.pos()
+        if not self.selecting:
+            # Hit-testing is a grid lookup, cheap enough for every move
+            self.setCursor(Qt.IBeamCursor if self.word_near(pos, nearest=False) else Qt.ArrowCursor)
+            return super().mouseMoveEvent(event)
+        if self.selection_box is not None:
+            index = self.selection_box[0]
+            rect = self.page_rect(index)
+            pos.setX(min(max(pos.x(), rect.left()), rect.right()))
+            pos.setY(min(max(pos.y(), rect.top()), rect.bottom()))
+            x, y = self.map_to_page(index, pos)
+            self.selection_box = self.selection_box[:3] + (x, y)
+            self.update()
+        else:
+            word = self.word_near(pos)
+            if word is not None and word != self.selection_focus:
+                self.selection_focus = word
+                self.update()
+
+    def mouseReleaseEvent(self, event):
+        if event.button() == Qt.LeftButton and self.selecting:
+            self.selecting = False
+        else:
+            super().mouseReleaseEvent(event)
+
+    def draw_selection(self, painter, exposed_pages):
+        if self.selection_anchor is None and self.selection_box is None:
+            return
+        painter.save()
+        painter.setCompositionMode(QPainter.CompositionMode_Multiply)
+        color = QColor(150, 190, 255)
+        for index, words in self.selected_ranges(exposed_pages):
+            page_words = self.text_layer.page(index).words
+            for word in words:
+                painter.fillRect(self.highlight_rect(index, page_words[word][:4]), color)
+        painter.restore()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_visible_update()
+        self.layoutChanged.emit()
+
+    def moveEvent(self, event):
+        super().moveEvent(event)
+        self.layoutChanged.emit()
+
+    @metrics.timed('pageview.paint')
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if not self.page_sizes:
+            painter.drawText(self.rect(), Qt.AlignCenter, self.message)
+            return
+
+        exposed = event.rect()
+        if self.scale != self.render_scale and not self.zooming:
+            # Renders are drawn scaled between render levels; filter them once zooming stops
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        for index in self.pages_in_range(exposed.top(), exposed.bottom()):
+            rect = self.page_rect(index)
+            if self.is_tiled(index):
+                # Stitch the rendered tiles over a scaled preview or white
+                if not self.draw_preview(painter, index, rect, exposed):
+                    painter.fillRect(rect.intersected(exposed), Qt.white)
+                for tile in self.page_tiles(index, exposed):
+                    image = self.images.get((index, tile))
+                    if image is not None:
+                        painter.drawImage(self.slot_rect((index, tile)), image)
+            else:
+                image = self.images.get((index, None))
+                if image is not None and image.size() == rect.size():
+                    painter.drawImage(rect.topLeft(), image)
+                elif image is not None:
+                    painter.drawImage(QRectF(rect), image)
+                elif not self.draw_preview(painter, index, rect, exposed):
+                    # Placeholder until the page is rendered
+                    painter.fillRect(rect.intersected(exposed), Qt.white)
+            self.draw_highlights(painter, index)
+            painter.setPen(QPen(QColor(200, 200, 200), 1))
+            painter.drawRect(rect.adjusted(0, 0, -1, -1))
+        self.draw_selection(painter, self.pages_in_range(exposed.top(), exposed.bottom()))
@@ -0,0 +1,149 @@
+# Page rasterization for render worker processes. Nothing here imports Qt,
+# so workers stay light and headless tools can reuse the same functions.
+from collections import OrderedDict
+import os
+
+import fitz  # PyMuPDF
+
+from .session import DocumentSession
+from . import sharedbuffers
+from . import diskcache
+
+# Sessions opened by this process, most recently used last
+_sessions = OrderedDict()
+MAX_OPEN_DOCUMENTS = 4
+
+
+def warm_up():
+    """Submitted to start a worker; importing this module was the work"""
+
+
+def open_session(path):
+    """Return a cached DocumentSession for path, reopening it if the file changed"""
+    session = _sessions.get(path)
+    if session and session.is_current():
+        _sessions.move_to_end(path)
+        return session
+    if session:
+        session.close()
+
+    session = DocumentSession(path)
+    _sessions[path] = session
+    while len(_sessions) > MAX_OPEN_DOCUMENTS:
+        _, old_session = _sessions.popitem(last=False)
+        old_session.close()
+    return session
+
+
+def render_pixmap(path, page_number, scale, clip=None, draft=False, disk_cache=None, rgbx=False):
+    """
+    Render one page at the given scale (pixels per PDF point) to a fitz.Pixmap.
+
+    clip is an optional (x0, y0, x1, y1) rectangle in output pixels that
+    limits rendering to one tile of the page. Pages are rendered from their
+    cached display list, so zooming does not re-interpret the page. Draft
+    renders skip anti-aliasing, which roughly halves rasterization time.
+    disk_cache is an optional (directory, max bytes) DiskRenderCache that
+    full quality renders are looked up in and stored to. rgbx renders
+    opaque 4-byte pixels (see session.render_rgbx), except for renders
+    going through the disk cache, which keeps them as RGB.
+    """
+    if disk_cache is not None and not draft:
+        cache = diskcache.open_cache(*disk_cache)
+        key = cache.make_key(diskcache.file_fingerprint(path), page_number, scale, clip)
+        pix = cache.get(key)
+        if pix is None:
+            pix = render_pixmap(path, page_number, scale, clip)
+            cache.put(key, pix)
+        return pix
+
+    session = open_session(path)
+    if clip is not None:
+        clip = fitz.Rect(clip) * (1 / scale)
+    if not draft:
+        return session.render(page_number, scale, clip, rgbx=rgbx)
+
+    aa_levels = fitz.TOOLS.show_aa_level()
+    fitz.TOOLS.set_aa_level(0)
+    try:
+        return session.render(page_number, scale, clip, rgbx=rgbx)
+    finally:
+        fitz.TOOLS.set_aa_level(aa_levels['graphics'])
+
+
+def render_page_to_buffer(path, page_number, scale, clip=None, draft=False, buffer_name=None, disk_cache=None):
+    """
+    Render one page like render_pixmap into a shared memory slab.
+
+    The pixels are written as RGBX8888 (4 bytes per pixel, so every row is
+    32-bit aligned) and the GUI process wraps the slab in a QImage without
+    copying. Returns ('buffer', width, height, stride), or
+    ('bytes', width, height, stride, samples) when the slab is too small.
+    """
+    pix = render_pixmap(path, page_number, scale, clip, draft, disk_cache, rgbx=True)
+    if not pix.alpha:
+        # Renders from the disk cache are RGB; add an opaque alpha channel to get 4-byte pixels
+        pix = fitz.Pixmap(pix, 1)
+    size = pix.stride * pix.height
+    with sharedbuffers.attached(buffer_name) as slab:
+        if size > slab.size:
+            return 'bytes', pix.width, pix.height, pix.stride, pix.samples
+        slab.buf[:size] = pix.samples_mv
+    return 'buffer', pix.width, pix.height, pix.stride
+
+
+def render_page_to_file(path, page_number, dpi, output_path, format='png', quality=90):
+    """
+    Render one page at dpi straight to an image file for exporting.
+
+    format is 'png', 'jpeg' or 'raw' (packed RGB bytes, the size is returned).
+    Pages are rendered once, so they bypass the display list and page caches
+    of the session. The image is written under a temporary name and renamed,
+    so a file at output_path is always complete. Returns (width, height,
+    bytes written).
+    """
+    session = open_session(path)
+    pix = session.doc.load_page(page_number).get_pixmap(dpi=dpi)
+    part_path = output_path + '.part'
+    if format == 'raw':
+        with open(part_path, 'wb') as f:
+            f.write(pix.samples_mv)
+    elif format == 'jpeg':
+        pix.save(part_path, output='jpeg', jpg_quality=quality)
+    else:
+        pix.save(part_path, output='png')
+    os.replace(part_path, output_path)
+    return pix.width, pix.height, os.path.getsize(output_path)
+
+
+def render_thumbnail(path, height, output_path):
+    """
+    Render the first page of path as a PNG height pixels tall.
+
+    The document is opened just for this and not kept in the session cache.
+    The file is written under a temporary name and renamed, so a file at
+    output_path is always complete.
+    """
+    with fitz.open(path) as doc:
+        page = doc.load_page(0)
+        scale = height / page.rect.height
+        pix = page.get_pixmap(matrix=fitz.Matrix(scale, scale))
+    part_path = output_path + '.part'
+    pix.save(part_path, output='png')
+    os.replace(part_path, output_path)
+
+
+def render_thumbnails(path, page_numbers, width, disk_cache=None):
+    """
+    Render a batch of pages width pixels wide for the thumbnail panel.
+
+    Batching saves a round trip to the worker per thumbnail. Returns a list
+    of (page number, width, height, stride, RGB samples).
+    """
+    session = open_session(path)
+    thumbnails = []
+    for number in page_numbers:
+        scale = width / session.page(number).rect.width
+        pix = render_pixmap(path, number, scale, disk_cache=disk_cache)
+        thumbnails.append((number, pix.width, pix.height, pix.stride, pix.samples))
+    return thumbnails
@@ -1,34 +1,182 @@
-from PyQt5.QtCore import QSettings
+from PyQt5.QtCore import QObject, QSettings, QStandardPaths, pyqtSignal
+from PyQt5.QtGui import QImage
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import multiprocessing
 import os
+import time
 
-class RecentFilesManager:
-    def __init__(self, max_files=5):
+class RecentFilesManager(QObject):
+    """
+    Recently opened files with existence checks and first-page thumbnails.
+
+    Nothing here touches the disk on the GUI thread: entries are checked
+    with os.stat on a thread pool (a stat on a slow network share can take
+    seconds) and the results are cached. Missing thumbnails are handed
+    back to the GUI thread, which has them rendered in a worker process
+    and cached on disk under a name derived from path, mtime and size, so
+    a changed file gets a new thumbnail. filesChanged is emitted whenever
+    a check or thumbnail finishes and the menu should be rebuilt.
+    """
+    filesChanged = pyqtSignal()
+    _thumbnailMissing = pyqtSignal(str, object)  # path, status
+    _thumbnailReady = pyqtSignal(str, object, object, bool)  # path, status, future, retried
+
+    def __init__(self, max_files=None, thumbnail_height=96, recheck_after=30):
+        super().__init__()
         self.settings = QSettings('PeeDoFile', 'PDFViewer')
-        self.max_files = max_files
+        self.max_files = max_files or int(self.settings.value('recentFilesMax', 20))
+        self.thumbnail_height = thumbnail_height
+        self.recheck_after = recheck_after  # Seconds before a checked entry is checked again
+        self.status = {}  # Path -> (exists, mtime_ns, size, checked at)
+        self.checking = set()
+        self.thumbnails = {}  # Path -> QImage, for the entry's current mtime and size
+        self.rendering = set()
+        self.failed = set()  # (path, mtime_ns, size) of files whose thumbnail could not be rendered
+        self.stat_pool = None
+        self.thumbnail_pool = None
+        self.thumbnail_dir = os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.CacheLocation) or os.path.expanduser('~/.cache'),
+            'PeeDoFile', 'thumbnails')
+        # Rendering is started and finished on the GUI thread, which owns the worker pool
+        self._thumbnailMissing.connect(self.render_thumbnail)
+        self._thumbnailReady.connect(self.thumbnail_rendered)
 
     def add_recent_file(self, file_path):
         """Add a file to recent files list"""
-        recent_files = self.get_recent_files()
-        
+        recent_files = self.stored_files()
+
         # Remove file_path if it already exists
         if file_path in recent_files:
             recent_files.remove(file_path)
-            
+
         # Add to the beginning of the list
         recent_files.insert(0, file_path)
-        
+
         # Keep only max_files entries
         recent_files = recent_files[:self.max_files]
-        
+
         # Save the list
         self.settings.setValue('recentFiles', recent_files)
+        # The file was just opened, so it exists; its thumbnail may be stale
+        self.status.pop(file_path, None)
+        self.thumbnails.pop(file_path, None)
+        self.validate([file_path])
 
-    def get_recent_files(self):
-        """Get list of recent files"""
+    def stored_files(self):
         files = self.settings.value('recentFiles', [])
-        # Filter out files that no longer exist
-        return [f for f in files if os.path.exists(f)] if files else []
+        if isinstance(files, str):
+            files = [files]  # QSettings returns a single entry as a plain string
+        return list(files or [])
+
+    def get_recent_files(self):
+        """Get list of recent files, leaving out those found to be missing"""
+        # Entries not checked yet are listed; the check runs in the background
+        return [f for f in self.stored_files() if self.status.get(f, (True,))[0]]
 
     def clear_recent_files(self):
         """Clear the recent files list"""
         self.settings.setValue('recentFiles', [])
+
+    def set_max_files(self, max_files):
+        self.max_files = max_files
+        self.settings.setValue('recentFilesMax', max_files)
+        self.settings.setValue('recentFiles', self.stored_files()[:max_files])
+
+    def validate(self, files=None):
+        """Check entries in the background whose last check is older than recheck_after"""
+        now = time.monotonic()
+        for path in self.stored_files() if files is None else files:
+            status = self.status.get(path)
+            if path in self.checking or (status and now - status[3] < self.recheck_after):
+                continue
+            if self.stat_pool is None:
+                self.stat_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='recent-files')
+            self.checking.add(path)
+            self.stat_pool.submit(self.check, path)
+
+    def check(self, path):
+        """Runs on the thread pool"""
+        try:
+            stat = os.stat(path)
+            status = (True, stat.st_mtime_ns, stat.st_size, time.monotonic())
+        except OSError:
+            status = (False, 0, 0, time.monotonic())
+        changed = self.status.get(path, (None,))[:3] != status[:3]
+        self.status[path] = status
+        self.checking.discard(path)
+        if status[0] and path not in self.thumbnails:
+            self.load_thumbnail(path, status)
+        if changed:
+            self.filesChanged.emit()
+
+    def thumbnail_path(self, path, status):
+        key = f"{os.path.abspath(path)}|{status[1]}|{status[2]}|{self.thumbnail_height}"
+        return os.path.join(self.thumbnail_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.png')
+
+    def load_thumbnail(self, path, status):
+        """Runs on the thread pool: use the cached thumbnail or have one rendered"""
+        cached = self.thumbnail_path(path, status)
+        image = QImage(cached) if os.path.exists(cached) else QImage()
+        if not image.isNull():
+            self.thumbnails[path] = image
+            self.filesChanged.emit()
+        else:
+            os.makedirs(self.thumbnail_dir, exist_ok=True)
+            self._thumbnailMissing.emit(path, status)
+
+    def get_executor(self):
+        if self.thumbnail_pool is None:
+            self.thumbnail_pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self.thumbnail_pool
+
+    def render_thumbnail(self, path, status, retried=False):
+        """Have a thumbnail rendered in the worker process, unless that failed for this version of the file"""
+        if path in self.rendering or (path, *status[1:3]) in self.failed:
+            return
+        self.rendering.add(path)
+        from . import rasterizer  # Imports PyMuPDF, normally preloaded by now
+        args = (rasterizer.render_thumbnail, path, self.thumbnail_height, self.thumbnail_path(path, status))
+        try:
+            future = self.get_executor().submit(*args)
+        except BrokenProcessPool:
+            # The worker died since the last thumbnail; start a fresh one
+            self.thumbnail_pool = None
+            future = self.get_executor().submit(*args)
+        future.executor = self.thumbnail_pool
+        # Results arrive on an executor thread; hop back to the GUI thread
+        future.add_done_callback(
+            lambda f, path=path, status=status: self._thumbnailReady.emit(path, status, f, retried))
+
+    def thumbnail_rendered(self, path, status, future, retried):
+        self.rendering.discard(path)
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, BrokenProcessPool):
+            if future.executor is self.thumbnail_pool:
+                # Thumbnails still queued in the dead pool fail the same way; only replace it once
+                self.thumbnail_pool.shutdown(wait=False, cancel_futures=True)
+                self.thumbnail_pool = None
+            if not retried:
+                # The worker may have died on another file; a file that kills it again is given up on
+                self.render_thumbnail(path, status, retried=True)
+                return
+        if error is not None:
+            self.failed.add((path, *status[1:3]))
+            return
+        image = QImage(self.thumbnail_path(path, status))
+        if not image.isNull() and self.status.get(path, (None,))[:3] == status[:3]:
+            self.thumbnails[path] = image
+            self.filesChanged.emit()
+
+    def thumbnail(self, path):
+        """Cached first-page thumbnail of a recent file, or None while it is not ready"""
+        return self.thumbnails.get(path)
+
+    def shutdown(self):
+        if self.stat_pool is not None:
+            self.stat_pool.shutdown(wait=False, cancel_futures=True)
+        if self.thumbnail_pool is not None:
+            self.thumbnail_pool.shutdown(wait=False, cancel_futures=True)
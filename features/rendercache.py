@@ -0,0 +1,114 @@
+from collections import OrderedDict
+import os
+
+def document_id(path):
+    """Identity of a document file; changes whenever the file is rewritten"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+class RenderCache:
+    """
+    In-memory LRU cache of rendered pages with a byte budget.
+
+    Keys are (document id, page number, zoom, rotation, tile); values are
+    QImages. tile is None for a whole page.
+    """
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # Key -> (image, size in bytes), oldest first
+        self.current_bytes = 0
+        self.page_zooms = {}  # (document id, page number, rotation) -> zooms of whole-page entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(doc_id, page_number, zoom, rotation=0, tile=None):
+        return (doc_id, page_number, zoom, rotation, tile)
+
+    @staticmethod
+    def image_bytes(image):
+        return image.width() * image.height() * image.depth() // 8
+
+    def get(self, key):
+        """Return the cached image for key, or None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, image):
+        """Store an image, evicting least recently used ones beyond the budget"""
+        size = self.image_bytes(image)
+        if size > self.max_bytes:
+            return  # Would evict everything else and still not fit
+        self.remove(key)
+        self.entries[key] = (image, size)
+        self.current_bytes += size
+        doc_id, page_number, zoom, rotation, tile = key
+        if tile is None:
+            self.page_zooms.setdefault((doc_id, page_number, rotation), set()).add(zoom)
+        self.evict()
+
+    def remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry:
+            self.forget(key, entry[1])
+
+    def forget(self, key, size):
+        """Update the byte count and zoom index for an entry that was dropped"""
+        self.current_bytes -= size
+        doc_id, page_number, zoom, rotation, tile = key
+        if tile is None:
+            zooms = self.page_zooms.get((doc_id, page_number, rotation))
+            if zooms:
+                zooms.discard(zoom)
+                if not zooms:
+                    del self.page_zooms[(doc_id, page_number, rotation)]
+
+    def nearest(self, doc_id, page_number, zoom, rotation=0):
+        """
+        Return (zoom, image) of the cached whole-page render closest to zoom,
+        or None. Used to show a scaled preview while the exact zoom renders.
+        """
+        zooms = self.page_zooms.get((doc_id, page_number, rotation))
+        if not zooms:
+            return None
+        # Prefer sharper renders when two are equally close
+        best = min(zooms, key=lambda z: (abs(z - zoom), -z))
+        return best, self.entries[self.make_key(doc_id, page_number, best, rotation)][0]
+
+    def remove_document(self, doc_id):
+        """Drop every render of a document"""
+        for key in [key for key in self.entries if key[0] == doc_id]:
+            self.remove(key)
+
+    def set_max_bytes(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.evict()
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits its budget"""
+        while self.current_bytes > self.max_bytes and self.entries:
+            old_key, (_, old_size) = self.entries.popitem(last=False)
+            self.forget(old_key, old_size)
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.page_zooms.clear()
+        self.current_bytes = 0
+
+    def stats(self):
+        """Counters for monitoring cache effectiveness"""
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self.entries),
+            'bytes': self.current_bytes,
+            'max_bytes': self.max_bytes,
+        }
@@ -0,0 +1,163 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+from PyQt5.QtGui import QImage
+from PyQt5 import sip
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import time
+
+from .sharedbuffers import SharedBufferPool
+from .metrics import metrics
+
+class BufferImage(QImage):
+    """
+    QImage that shows pixels in a buffer it does not own.
+
+    owner keeps the buffer alive (and, for pooled slabs, out of the pool)
+    for as long as this image exists.
+    """
+    def __init__(self, buffer, owner, width, height, stride, format):
+        super().__init__(sip.voidptr(buffer), width, height, stride, format)
+        self.owner = owner
+
+class PDFRenderer(QObject):
+    """
+    Renders pages in a pool of worker processes.
+
+    PyMuPDF holds the GIL while rasterizing, so rendering on a thread would
+    still freeze the GUI. Requests are keyed by slot, which is either
+    (page index, None) for a whole page or (page index, tile) for one tile of
+    it. A newer request for a slot supersedes the older one, and results of
+    superseded or cancelled requests are dropped instead of being delivered.
+
+    Workers write pixels into shared memory slabs from a SharedBufferPool and
+    the delivered QImage wraps the slab directly, so a render is not copied
+    again on its way to the screen.
+    """
+    # The image is passed as object so receivers get the BufferImage itself,
+    # not a QImage copy that would lose the reference keeping its buffer alive
+    pageRendered = pyqtSignal(object, float, bool, object)  # slot, scale, draft, image
+    _resultReady = pyqtSignal(object, object, object)  # request, future, lease
+
+    def __init__(self, parent=None, max_workers=None):
+        super().__init__(parent)
+        self.max_workers = max_workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.executor = None
+        self.path = None
+        self.pending = {}  # Slot -> (request, future, submit time)
+        self.buffer_pool = SharedBufferPool()
+        self.disk_cache = None  # Optional (directory, max bytes) of a DiskRenderCache for the workers
+
+        # Results arrive on an executor thread; hop back to the GUI thread
+        self._resultReady.connect(self._deliver)
+
+    def get_executor(self):
+        if self.executor is None:
+            context = multiprocessing.get_context("spawn")
+            self.executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=context)
+        return self.executor
+
+    def warm_up(self):
+        """Start a worker ahead of the first render, so that render does not wait for it"""
+        if self.executor is None:
+            from . import rasterizer
+            self.get_executor().submit(rasterizer.warm_up)
+
+    def set_document(self, path):
+        """Switch to a new document, dropping every pending request"""
+        self.cancel_all()
+        self.path = path
+
+    def render(self, slot, scale, size, clip=None, draft=False):
+        """
+        Request a slot at scale, superseding any older request for it.
+
+        size is the expected (width, height) of the render in pixels, clip is
+        the (x0, y0, x1, y1) pixel rectangle of a tile slot and draft requests
+        a faster render without anti-aliasing.
+        """
+        if not self.path:
+            return
+        current = self.pending.get(slot)
+        request = (self.path, slot, scale, draft)
+        if current:
+            if current[0] == request:
+                return  # Same render is already on its way
+            current[1].cancel()
+            metrics.count('renderer.superseded')
+
+        # Leave room for rounding of the page size to whole pixels
+        lease = self.buffer_pool.acquire((size[0] + 2) * (size[1] + 2) * 4)
+        from . import rasterizer  # Imports PyMuPDF, so only once there is something to render
+        args = (rasterizer.render_page_to_buffer, self.path, slot[0], scale, clip, draft, lease.name, self.disk_cache)
+        try:
+            future = self.get_executor().submit(*args)
+        except BrokenProcessPool:
+            # A worker died (e.g. crashed on a broken page); start a fresh pool
+            self.executor = None
+            future = self.get_executor().submit(*args)
+        self.pending[slot] = (request, future, time.perf_counter())
+        # The lease travels with the result so the slab is not reused while a worker writes to it
+        future.add_done_callback(lambda f, request=request, lease=lease: self._resultReady.emit(request, f, lease))
+
+    def cancel(self, slot):
+        """Cancel the request for a slot that is no longer needed"""
+        current = self.pending.pop(slot, None)
+        if current:
+            current[1].cancel()
+            metrics.count('renderer.cancelled')
+
+    def cancel_all(self):
+        pending = list(self.pending.values())
+        self.pending.clear()
+        for _, future, _ in pending:
+            future.cancel()
+        if pending:
+            metrics.count('renderer.cancelled', len(pending))
+
+    def is_pending(self, slot):
+        return slot in self.pending
+
+    def _deliver(self, request, future, lease):
+        path, slot, scale, draft = request
+        current = self.pending.get(slot)
+        if not current or current[1] is not future:
+            return  # Superseded or cancelled while rendering
+        del self.pending[slot]
+        metrics.record('renderer.draft_latency' if draft else 'renderer.latency', time.perf_counter() - current[2])
+
+        if future.cancelled():
+            return
+        try:
+            result = future.result()
+        except Exception as e:
+            print(f"Error rendering page {slot[0] + 1}: {str(e)}")
+            return
+
+        if result[0] == 'buffer':
+            _, width, height, stride = result
+            img = BufferImage(lease.buf, lease, width, height, stride, QImage.Format_RGBX8888)
+        else:
+            # The render did not fit the slab and came back pickled
+            _, width, height, stride, samples = result
+            img = BufferImage(samples, samples, width, height, stride, QImage.Format_RGBX8888)
+        self.pageRendered.emit(slot, scale, draft, img)
+
+    def recycle(self):
+        """
+        Stop the worker processes and wait for them to exit, e.g. so they let
+        go of a file that is about to be replaced. Later renders start new ones.
+        """
+        self.cancel_all()
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        self.cancel_all()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        self.buffer_pool.close()
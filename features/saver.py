@@ -0,0 +1,172 @@
+# Writing documents back to disk. Nothing here imports Qt, so the same code
+# serves the GUI, background save workers and headless tools.
+import os
+import shutil
+import tempfile
+import time
+
+import fitz  # PyMuPDF
+
+from .strokes import write_strokes
+
+# Seconds a background save waits for the GUI to close a file it replaces
+RELEASE_TIMEOUT = 30
+
+class SaveCancelled(Exception):
+    """Raised from a progress callback to stop a save before anything is written"""
+
+class SaveTimer:
+    """Wall-clock time spent in each phase of a save, in phase order"""
+    def __init__(self):
+        self.phases = {}
+        self.started = time.perf_counter()
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def summary(self):
+        parts = ", ".join(f"{name} {seconds * 1000:.0f} ms" for name, seconds in self.phases.items())
+        return f"{self.total * 1000:.0f} ms ({parts})"
+
+class _Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        self.timer.phases[self.name] = self.timer.phases.get(self.name, 0.0) + elapsed
+
+def same_file(path, other):
+    try:
+        return os.path.samefile(path, other)
+    except OSError:
+        return os.path.abspath(path) == os.path.abspath(other)
+
+def replace_file(write, output_path, timer=None, release=None):
+    """
+    Call write(temp_path) and move the result over output_path in one step.
+
+    The temporary file lives next to the target so os.replace stays a rename
+    on the same file system; readers see either the old or the new file,
+    never a half-written one. release, if given, is called between the two
+    so that whoever holds output_path open can close it; Windows cannot
+    replace a file that is open.
+    """
+    timer = timer or SaveTimer()
+    directory = os.path.dirname(os.path.abspath(output_path))
+    fd, temp_path = tempfile.mkstemp(suffix='.pdf', dir=directory)
+    os.close(fd)
+    try:
+        with timer.phase("write"):
+            write(temp_path)
+        if release:
+            release()
+        with timer.phase("replace"):
+            if os.path.exists(output_path):
+                shutil.copymode(output_path, temp_path)
+            os.replace(temp_path, output_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+def save_document(source_path, output_path, strokes=None, flatten=False, timer=None, progress=None, edit=None,
+                  release=None):
+    """
+    Save source_path to output_path with the strokes of a StrokeStore added.
+    edit, if given, is called with the open fitz document to make further
+    changes (e.g. stamps) before it is written.
+
+    Saving over the source appends only the changed objects (an incremental
+    save). Saving elsewhere writes the document once to a temporary file that
+    then atomically replaces output_path; without changes the file is copied
+    byte for byte instead of being re-serialized. Returns the SaveTimer with
+    the time spent in each phase.
+
+    progress, if given, is called with (steps done, total steps) as pages are
+    annotated, before the file is written and once it is (done == total). It
+    may raise SaveCancelled to abandon the save; once writing has started the
+    save runs to completion.
+
+    release, if given, is called when a rewritten file is about to replace
+    source_path, for other processes to close the source first.
+    """
+    timer = timer or SaveTimer()
+    in_place = same_file(source_path, output_path)
+
+    if not strokes and edit is None:
+        if progress:
+            progress(0, 1)
+        if not in_place:
+            replace_file(lambda temp_path: shutil.copyfile(source_path, temp_path), output_path, timer)
+        if progress:
+            progress(1, 1)
+        return timer
+
+    with timer.phase("open"):
+        doc = fitz.open(source_path)
+    try:
+        # One step per annotated page plus one for writing the file
+        total = (len(strokes.pages) if strokes else 0) + 1
+        with timer.phase("annotate"):
+            # Only pages with strokes are loaded and changed
+            if strokes:
+                write_strokes(doc, strokes, flatten=flatten,
+                              progress=(lambda done, pages: progress(done, total)) if progress else None)
+            if edit is not None:
+                edit(doc)
+
+        if in_place and doc.can_save_incrementally():
+            with timer.phase("write"):
+                doc.save(source_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        else:
+            def write(temp_path):
+                doc.save(temp_path)
+                # Let go of the source before it may be replaced
+                doc.close()
+            replace_file(write, output_path, timer, release if in_place else None)
+    finally:
+        if not doc.is_closed:
+            doc.close()
+    if progress:
+        progress(total, total)
+    return timer
+
+def save_in_worker(source_path, output_path, strokes, flatten, messages, cancel_event, released_event):
+    """
+    Process entry point for background saves.
+
+    Reports ('progress', done, total), then one of ('done', summary, phases),
+    ('cancelled',) or ('error', message) on the messages queue. Setting
+    cancel_event stops the save at the next page, unless writing has begun.
+    Before a rewritten file replaces the source, ('release',) is reported
+    and the worker waits for released_event, set once the GUI has closed
+    the file.
+    """
+    def progress(done, total):
+        if cancel_event.is_set() and done < total:
+            raise SaveCancelled()
+        messages.put(('progress', done, total))
+
+    def release():
+        messages.put(('release',))
+        released_event.wait(RELEASE_TIMEOUT)
+
+    try:
+        timer = save_document(source_path, output_path, strokes, flatten=flatten, progress=progress,
+                              release=release)
+        messages.put(('done', timer.summary(), timer.phases))
+    except SaveCancelled:
+        messages.put(('cancelled',))
+    except Exception as e:
+        messages.put(('error', str(e)))
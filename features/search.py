@@ -0,0 +1,144 @@
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import multiprocessing
+import os
+import queue
+import threading
+import time
+
+from .textindex import TextIndex
+from .metrics import metrics
+
+class DocumentSearch(QObject):
+    """
+    Full-text search over one document, indexed in the background.
+
+    The index is loaded from the disk cache on a thread when this file was
+    indexed before. Otherwise a worker process extracts the words, starting
+    at the page being viewed, and batches are added to the index as they
+    arrive, so those pages can be searched right away and the rest as
+    indexing goes on. The finished index is written back to the cache on a
+    thread. indexUpdated is emitted whenever more pages became searchable.
+    """
+    indexUpdated = pyqtSignal(int, int)  # pages indexed, page count
+    _indexLoaded = pyqtSignal(object)  # TextIndex or None
+
+    def __init__(self, path, page_count, cache_dir, first_page=0, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.cache_dir = cache_dir
+        self.first_page = first_page
+        self.index = TextIndex(page_count)
+        self.fingerprint = None
+        self.process = None
+        self.messages = None
+        self.cancel_event = None
+        # Set by stop(); the loader thread checks it under the lock before reporting back
+        self.stopped = False
+        self.lock = threading.Lock()
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(50)
+        self.poll_timer.timeout.connect(self.poll)
+        self._indexLoaded.connect(self.on_index_loaded)
+
+    def cache_path(self):
+        return os.path.join(self.cache_dir, self.fingerprint + '.idx')
+
+    def start(self):
+        threading.Thread(target=self.load_cached, daemon=True).start()
+
+    def load_cached(self):
+        """Runs on a thread: look for an index saved by an earlier session"""
+        from .diskcache import file_fingerprint
+        index = None
+        try:
+            self.fingerprint = file_fingerprint(self.path)
+        except OSError:
+            pass
+        else:
+            start = time.perf_counter()
+            index = TextIndex.load(self.cache_path(), self.fingerprint)
+            if index is not None:
+                metrics.record('search.load_index', time.perf_counter() - start)
+        # Once stopped this object may be deleted, so it must not be signalled
+        with self.lock:
+            if not self.stopped:
+                self._indexLoaded.emit(index)
+
+    def on_index_loaded(self, index):
+        if self.stopped:
+            return  # Stopped while the cache was being read
+        if index is not None:
+            self.index = index
+            self.indexUpdated.emit(len(index.indexed), index.page_count)
+            return
+        from . import textindex
+        context = multiprocessing.get_context("spawn")
+        self.messages = context.Queue()
+        self.cancel_event = context.Event()
+        self.process = context.Process(
+            target=textindex.index_in_worker,
+            args=(self.path, self.messages, self.cancel_event, self.first_page),
+            daemon=True)
+        self.started = time.perf_counter()
+        self.process.start()
+        self.poll_timer.start()
+
+    def poll(self):
+        if self.read_messages() or not self.poll_timer.isActive():
+            return
+        if not self.process.is_alive():
+            # It may have sent its last pages and 'done' between the read above and exiting
+            if self.read_messages():
+                return
+            # Exited without reporting back, e.g. crashed in MuPDF
+            print(f"Error indexing {self.path}: indexing process exited with code {self.process.exitcode}")
+            self.stop()
+
+    def read_messages(self):
+        """Add the pages the worker sent so far; returns whether its final message was among them"""
+        added = False
+        finished = False
+        while True:
+            try:
+                message = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if message[0] == 'pages':
+                with metrics.timer('search.add_pages'):
+                    for number, tokens, rects in message[1]:
+                        self.index.add_page(number, tokens, rects)
+                added = True
+                continue
+            self.stop()
+            finished = True
+            if message[0] == 'done':
+                metrics.record('search.build_index', time.perf_counter() - self.started)
+                if self.fingerprint:
+                    threading.Thread(target=self.index.save, args=(self.cache_path(), self.fingerprint),
+                                     daemon=True).start()
+            elif message[0] == 'error':
+                print(f"Error indexing {self.path}: {message[1]}")
+            break
+        if added:
+            self.indexUpdated.emit(len(self.index.indexed), self.index.page_count)
+        return finished
+
+    def is_indexing(self):
+        return self.poll_timer.isActive()
+
+    @metrics.timed('search.query')
+    def search(self, query):
+        """Hits of query among the pages indexed so far, see TextIndex.search"""
+        return self.index.search(query)
+
+    def stop(self):
+        """Stop indexing; pages indexed so far stay searchable"""
+        with self.lock:
+            self.stopped = True
+        self.poll_timer.stop()
+        if self.process is not None:
+            self.cancel_event.set()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.terminate()
+            self.process = None
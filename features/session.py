@@ -0,0 +1,114 @@
+from collections import OrderedDict
+import os
+
+import fitz  # PyMuPDF
+
+def render_rgbx(display_list, scale, clip=None):
+    """
+    Render a display list like DisplayList.get_pixmap, but straight into
+    4-byte pixels whose alpha is 255 everywhere, the layout of Qt's
+    RGBX8888. get_pixmap(alpha=True) would leave the page background
+    transparent, and adding alpha to an RGB render copies the whole frame,
+    so this starts from an opaque white pixmap and draws onto it.
+    """
+    mupdf = fitz.mupdf
+    matrix = fitz.Matrix(scale, scale)
+    area = display_list.rect if clip is None else fitz.Rect(clip) & display_list.rect
+    bbox = mupdf.fz_round_rect(mupdf.FzRect(*(area * matrix)))
+    pix = mupdf.fz_new_pixmap_with_bbox(mupdf.FzColorspace(mupdf.FzColorspace.Fixed_RGB), bbox,
+                                        mupdf.FzSeparations(), 1)
+    mupdf.fz_clear_pixmap_with_value(pix, 255)
+    device = mupdf.fz_new_draw_device_with_bbox(mupdf.FzMatrix(*matrix), pix, bbox)
+    mupdf.fz_run_display_list(display_list.this, device, mupdf.FzMatrix(), mupdf.FzRect(*area), mupdf.FzCookie())
+    mupdf.fz_close_device(device)
+    return fitz.Pixmap('raw', pix)
+
+class DocumentSession:
+    """
+    One open fitz document with cached pages and display lists.
+
+    Interpreting a page's content stream is the expensive part of rendering
+    vector-heavy pages. A display list records the interpreted drawing
+    commands once, so rendering the same page again at another zoom level or
+    clip only pays for rasterization.
+    """
+    def __init__(self, path, max_pages=64, max_display_lists=16):
+        self.path = path
+        self.doc = fitz.open(path)
+        self.file_key = self.get_file_key()
+        self.max_pages = max_pages
+        self.max_display_lists = max_display_lists
+        self.pages = OrderedDict()  # Page number -> fitz.Page, oldest first
+        self.display_lists = OrderedDict()  # Page number -> fitz.DisplayList, oldest first
+
+    def get_file_key(self):
+        stat = os.stat(self.path)
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def is_current(self):
+        """Whether the file on disk is still the one this session opened"""
+        try:
+            return self.get_file_key() == self.file_key
+        except OSError:
+            return False
+
+    @property
+    def page_count(self):
+        return self.doc.page_count
+
+    @property
+    def name(self):
+        return self.path
+
+    def page(self, number):
+        """Return the loaded page, loading it on first use"""
+        page = self.pages.get(number)
+        if page is not None:
+            self.pages.move_to_end(number)
+            return page
+        page = self.doc.load_page(number)
+        self.pages[number] = page
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        return page
+
+    def display_list(self, number):
+        """Return the display list of a page, interpreting the page on first use"""
+        display_list = self.display_lists.get(number)
+        if display_list is not None:
+            self.display_lists.move_to_end(number)
+            return display_list
+        display_list = self.page(number).get_displaylist()
+        self.display_lists[number] = display_list
+        while len(self.display_lists) > self.max_display_lists:
+            self.display_lists.popitem(last=False)
+        return display_list
+
+    def render(self, number, scale, clip=None, alpha=False, rgbx=False):
+        """
+        Render a page (or the clip rectangle in page coordinates) from its
+        display list; with rgbx into opaque 4-byte pixels, see render_rgbx
+        """
+        if rgbx:
+            return render_rgbx(self.display_list(number), scale, clip)
+        return self.display_list(number).get_pixmap(matrix=fitz.Matrix(scale, scale), clip=clip, alpha=alpha)
+
+    def invalidate(self, number=None):
+        """Forget cached pages and display lists after the document was edited"""
+        if number is None:
+            self.pages.clear()
+            self.display_lists.clear()
+        else:
+            self.pages.pop(number, None)
+            self.display_lists.pop(number, None)
+
+    def reopen(self):
+        """Open the file again after it was changed on disk, e.g. by a save"""
+        self.close()
+        self.doc = fitz.open(self.path)
+        self.file_key = self.get_file_key()
+
+    def close(self):
+        self.invalidate()
+        if not self.doc.is_closed:
+            self.doc.close()
@@ -0,0 +1,99 @@
+# Shared memory buffers that render workers write pixels into, so rendered
+# pages reach the GUI process without pickling. Nothing here imports Qt.
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+class BufferLease:
+    """
+    A slab of the pool lent out for one render.
+
+    The slab goes back to the pool when the lease is garbage collected, so
+    whoever shows the pixels (e.g. a QImage wrapping the buffer) only has to
+    keep a reference to the lease.
+    """
+    def __init__(self, pool, slab):
+        self.pool = pool
+        self.slab = slab
+
+    @property
+    def name(self):
+        return self.slab.name
+
+    @property
+    def size(self):
+        return self.slab.size
+
+    @property
+    def buf(self):
+        return self.slab.buf
+
+    def __del__(self):
+        pool, self.pool = self.pool, None
+        if pool is not None:
+            pool.release(self.slab)
+
+class SharedBufferPool:
+    """
+    Reusable shared memory slabs owned by the GUI process.
+
+    Slabs are rounded up to whole megabytes so they can be reused for renders
+    of a similar size, and up to max_free_bytes of returned slabs are kept.
+    """
+    granularity = 1024 * 1024
+
+    def __init__(self, max_free_bytes=64 * 1024 * 1024):
+        self.max_free_bytes = max_free_bytes
+        self.free = []  # Returned slabs, smallest first
+        self.free_bytes = 0
+        self.closed = False
+
+    def acquire(self, size):
+        """Lend out a slab of at least size bytes"""
+        for i, slab in enumerate(self.free):
+            if slab.size >= size:
+                del self.free[i]
+                self.free_bytes -= slab.size
+                return BufferLease(self, slab)
+        size = -(-size // self.granularity) * self.granularity
+        return BufferLease(self, shared_memory.SharedMemory(create=True, size=size))
+
+    def release(self, slab):
+        if self.closed or self.free_bytes + slab.size > self.max_free_bytes:
+            self.destroy(slab)
+            return
+        self.free.append(slab)
+        self.free.sort(key=lambda s: s.size)
+        self.free_bytes += slab.size
+
+    @staticmethod
+    def destroy(slab):
+        try:
+            slab.close()
+        except BufferError:
+            pass  # Still mapped by an image; the mapping goes away with the process
+        try:
+            slab.unlink()
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        """Free every pooled slab; slabs still lent out are freed on return"""
+        self.closed = True
+        for slab in self.free:
+            self.destroy(slab)
+        self.free.clear()
+        self.free_bytes = 0
+
+@contextmanager
+def attached(name):
+    """
+    Worker side: map a slab created by the GUI process for one write.
+
+    The mapping is closed right after, so slabs the pool destroys are not
+    kept alive by workers that wrote into them once.
+    """
+    slab = shared_memory.SharedMemory(name=name)
+    try:
+        yield slab
+    finally:
+        slab.close()
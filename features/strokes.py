@@ -0,0 +1,358 @@
+# Compact storage for freehand annotation strokes. Points are kept in PDF
+# page coordinates (unrotated, in points), so strokes do not depend on the
+# zoom level they were drawn at. Nothing here imports Qt.
+from array import array
+import math
+
+def simplify_points(points, tolerance):
+    """
+    Douglas-Peucker simplification of interleaved x, y points.
+
+    Returns a new array keeping only the points that lie further than
+    tolerance from the line through their neighbours, always keeping the
+    first and last point.
+    """
+    count = len(points) // 2
+    if count < 3 or tolerance <= 0:
+        return array('f', points)
+    keep = bytearray(count)
+    keep[0] = keep[count - 1] = 1
+    tolerance_sq = tolerance * tolerance
+    # Iterative to stay clear of the recursion limit on long strokes
+    stack = [(0, count - 1)]
+    while stack:
+        first, last = stack.pop()
+        x0, y0 = points[2 * first], points[2 * first + 1]
+        dx = points[2 * last] - x0
+        dy = points[2 * last + 1] - y0
+        length_sq = dx * dx + dy * dy
+        farthest, farthest_sq = -1, tolerance_sq
+        for i in range(first + 1, last):
+            px = points[2 * i] - x0
+            py = points[2 * i + 1] - y0
+            if length_sq:
+                cross = px * dy - py * dx
+                distance_sq = cross * cross / length_sq
+            else:
+                distance_sq = px * px + py * py  # Closed loop; measure from the end point
+            if distance_sq > farthest_sq:
+                farthest, farthest_sq = i, distance_sq
+        if farthest >= 0:
+            keep[farthest] = 1
+            stack.append((first, farthest))
+            stack.append((farthest, last))
+    simplified = array('f')
+    for i in range(count):
+        if keep[i]:
+            simplified.append(points[2 * i])
+            simplified.append(points[2 * i + 1])
+    return simplified
+
+class StrokeStyle:
+    """Drawing style shared by every stroke drawn with it"""
+    __slots__ = ('color', 'width')
+
+    def __init__(self, color, width):
+        self.color = color  # (r, g, b, a) with 0-255 components
+        self.width = width  # Line width in PDF points
+
+    def key(self):
+        return (self.color, self.width)
+
+class Stroke:
+    """One continuous pen stroke on a page"""
+    __slots__ = ('page', 'style', 'points')
+
+    def __init__(self, page, style):
+        self.page = page
+        self.style = style  # Index into StrokeStore.styles
+        self.points = array('f')  # Interleaved x, y pairs
+
+    def add_point(self, x, y):
+        self.points.append(x)
+        self.points.append(y)
+
+    def __len__(self):
+        return len(self.points) // 2
+
+    def point(self, i):
+        return self.points[2 * i], self.points[2 * i + 1]
+
+    def iter_points(self):
+        points = self.points
+        return zip(points[0::2], points[1::2])
+
+    def point_list(self):
+        """Points as a list of (x, y) tuples, as PyMuPDF expects them"""
+        return list(self.iter_points())
+
+    def simplify(self, tolerance):
+        """Drop points that deviate less than tolerance (in points) from the stroke"""
+        self.points = simplify_points(self.points, tolerance)
+
+    def bounds(self):
+        """(x0, y0, x1, y1) of the stroke's points"""
+        xs = self.points[0::2]
+        ys = self.points[1::2]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def state(self):
+        """Everything that is drawn of the stroke, to tell whether it changed since"""
+        return self.page, self.style, self.points.tobytes()
+
+    def translate(self, dx, dy):
+        points = self.points
+        for i in range(0, len(points), 2):
+            points[i] += dx
+            points[i + 1] += dy
+
+def segment_distance(px, py, x0, y0, x1, y1):
+    """Distance from a point to the segment x0, y0 - x1, y1"""
+    dx = x1 - x0
+    dy = y1 - y0
+    length_sq = dx * dx + dy * dy
+    t = 0.0
+    if length_sq:
+        t = max(0.0, min(1.0, ((px - x0) * dx + (py - y0) * dy) / length_sq))
+    return math.hypot(px - x0 - t * dx, py - y0 - t * dy)
+
+def point_in_polygon(x, y, polygon):
+    """Even-odd test of a point against a list of (x, y) vertices"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i]
+        xj, yj = polygon[j]
+        if (yi > y) != (yj > y) and x < (xj - xi) * (y - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+class StrokeGrid:
+    """
+    Uniform grid over the segments of the strokes on one page.
+
+    Every cell lists the (stroke, segment index) pairs whose bounding box
+    overlaps it, so hit-testing a point only measures the few segments
+    near it, however many points the page holds. Strokes are added and
+    removed one at a time as they are drawn, erased or moved.
+    """
+    def __init__(self, cell_size=16.0):
+        self.cell_size = cell_size
+        self.cells = {}  # (column, row) -> [(stroke, segment index), ...]
+
+    def cell_range(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return [(column, row)
+                for row in range(math.floor(y0 / size), math.floor(y1 / size) + 1)
+                for column in range(math.floor(x0 / size), math.floor(x1 / size) + 1)]
+
+    def segment_cells(self, stroke):
+        points = stroke.points
+        size = self.cell_size
+        for i in range(len(stroke) - 1):
+            x0, y0, x1, y1 = points[2 * i:2 * i + 4]
+            start = (math.floor(x0 / size), math.floor(y0 / size))
+            if start == (math.floor(x1 / size), math.floor(y1 / size)):
+                # Most segments are shorter than a cell
+                yield i, (start,)
+            else:
+                yield i, self.cell_range(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+    def add(self, stroke):
+        for i, cells in self.segment_cells(stroke):
+            for cell in cells:
+                self.cells.setdefault(cell, []).append((stroke, i))
+
+    def remove(self, stroke):
+        for cell in {cell for _, cells in self.segment_cells(stroke) for cell in cells}:
+            entries = self.cells.get(cell)
+            if entries:
+                entries[:] = [entry for entry in entries if entry[0] is not stroke]
+                if not entries:
+                    del self.cells[cell]
+
+    def strokes_near(self, x, y, radius, half_width=None, max_half_width=0.0):
+        """
+        Strokes passing within radius of a point. half_width, if given,
+        returns how far a stroke's line reaches beyond its points (at most
+        max_half_width), so strokes count from the edge of their line.
+        """
+        found = set()
+        reach = radius + max_half_width
+        for cell in self.cell_range(x - reach, y - reach, x + reach, y + reach):
+            for stroke, i in self.cells.get(cell, ()):
+                if stroke in found:
+                    continue
+                limit = radius + (half_width(stroke) if half_width else 0.0)
+                if segment_distance(x, y, *stroke.points[2 * i:2 * i + 4]) <= limit:
+                    found.add(stroke)
+        return found
+
+    def candidates(self, x0, y0, x1, y1):
+        """Strokes with a segment overlapping the cells of a rectangle"""
+        return {stroke for cell in self.cell_range(x0, y0, x1, y1) for stroke, _ in self.cells.get(cell, ())}
+
+class StrokeStore:
+    """
+    All strokes of a document, grouped by page, with shared style records.
+
+    Pages get a StrokeGrid the first time they are hit-tested; after that
+    finish_stroke, remove_stroke and move_strokes keep it current.
+    """
+    def __init__(self):
+        self.styles = []
+        self.style_indexes = {}  # (color, width) -> index into styles
+        self.pages = {}  # Page number -> list of strokes in drawing order
+        self.grids = {}  # Page number -> StrokeGrid of pages hit-tested so far
+
+    def __getstate__(self):
+        # Grids are rebuilt on demand; leave them out of the copy a save worker gets
+        state = self.__dict__.copy()
+        state['grids'] = {}
+        return state
+
+    def style_index(self, color, width):
+        """Index of the style record for color and width, creating it if needed"""
+        key = (tuple(color), width)
+        index = self.style_indexes.get(key)
+        if index is None:
+            index = len(self.styles)
+            self.styles.append(StrokeStyle(*key))
+            self.style_indexes[key] = index
+        return index
+
+    def begin_stroke(self, page, style):
+        """Start a new stroke on page drawn with the style at index style"""
+        stroke = Stroke(page, style)
+        self.pages.setdefault(page, []).append(stroke)
+        return stroke
+
+    def finish_stroke(self, stroke):
+        """Register a stroke whose points are complete with the page's grid"""
+        grid = self.grids.get(stroke.page)
+        if grid is not None:
+            grid.add(stroke)
+
+    def remove_stroke(self, stroke):
+        strokes = self.pages.get(stroke.page)
+        if strokes and stroke in strokes:
+            strokes.remove(stroke)
+            if not strokes:
+                del self.pages[stroke.page]
+            grid = self.grids.get(stroke.page)
+            if grid is not None:
+                grid.remove(stroke)
+
+    def grid(self, page):
+        """StrokeGrid of a page, built on first use"""
+        grid = self.grids.get(page)
+        if grid is None:
+            grid = self.grids[page] = StrokeGrid()
+            for stroke in self.pages.get(page, ()):
+                grid.add(stroke)
+        return grid
+
+    def strokes_at(self, page, x, y, radius):
+        """Strokes on a page whose line passes within radius (in points) of x, y"""
+        styles = self.styles
+        return self.grid(page).strokes_near(x, y, radius, lambda stroke: styles[stroke.style].width / 2,
+                                            max((style.width for style in styles), default=0) / 2)
+
+    def strokes_in_polygon(self, page, polygon):
+        """Strokes on a page lying entirely inside a polygon of (x, y) vertices"""
+        xs = [x for x, _ in polygon]
+        ys = [y for _, y in polygon]
+        found = []
+        for stroke in self.grid(page).candidates(min(xs), min(ys), max(xs), max(ys)):
+            if all(point_in_polygon(x, y, polygon) for x, y in stroke.iter_points()):
+                found.append(stroke)
+        return found
+
+    def strokes_in_rect(self, page, x0, y0, x1, y1):
+        """Strokes on a page lying entirely inside a rectangle"""
+        found = []
+        for stroke in self.grid(page).candidates(x0, y0, x1, y1):
+            sx0, sy0, sx1, sy1 = stroke.bounds()
+            if sx0 >= x0 and sy0 >= y0 and sx1 <= x1 and sy1 <= y1:
+                found.append(stroke)
+        return found
+
+    def move_strokes(self, strokes, dx, dy):
+        """Move strokes by dx, dy points on their pages"""
+        for stroke in strokes:
+            grid = self.grids.get(stroke.page)
+            if grid is not None:
+                grid.remove(stroke)
+            stroke.translate(dx, dy)
+            if grid is not None:
+                grid.add(stroke)
+
+    def restyle_strokes(self, strokes, color):
+        """Give strokes a new color, keeping their widths"""
+        for stroke in strokes:
+            stroke.style = self.style_index(color, self.styles[stroke.style].width)
+
+    def strokes_on_page(self, page):
+        return self.pages.get(page, [])
+
+    def __iter__(self):
+        for page in sorted(self.pages):
+            yield from self.pages[page]
+
+    def __len__(self):
+        return sum(len(strokes) for strokes in self.pages.values())
+
+    def point_count(self):
+        return sum(len(stroke) for strokes in self.pages.values() for stroke in strokes)
+
+    def clear(self):
+        self.pages.clear()
+        self.grids.clear()
+
+def write_strokes(doc, store, flatten=False, progress=None):
+    """
+    Write the strokes of store into an open fitz document.
+
+    By default the strokes become ink annotations, which viewers keep
+    editable: one per color and width on each page, holding every stroke
+    of that style as one of its paths. PyMuPDF's cost per annotation grows
+    with the annotations already on the page, so this is much faster than
+    one annotation per stroke; other viewers then select and delete those
+    strokes together. With flatten the strokes are drawn into the page
+    content instead, batched into one path per color and width on each
+    page. progress, if given, is called with (pages done, pages with
+    strokes) after each page.
+    """
+    page_numbers = sorted(store.pages)
+    for done, page_number in enumerate(page_numbers, 1):
+        page = doc[page_number]
+        by_style = {}
+        for stroke in store.pages[page_number]:
+            if len(stroke) > 1:
+                by_style.setdefault(stroke.style, []).append(stroke)
+        if flatten:
+            shape = page.new_shape()
+            for style_index, style_strokes in by_style.items():
+                style = store.styles[style_index]
+                for stroke in style_strokes:
+                    shape.draw_polyline(stroke.point_list())
+                shape.finish(color=pdf_color(style.color), width=style.width,
+                             lineCap=1, lineJoin=1, closePath=False,
+                             stroke_opacity=style.color[3] / 255)
+            shape.commit()
+        else:
+            for style_index, style_strokes in by_style.items():
+                style = store.styles[style_index]
+                annot = page.add_ink_annot([stroke.point_list() for stroke in style_strokes])
+                annot.set_colors(stroke=pdf_color(style.color))
+                annot.set_border(width=style.width)
+                annot.set_opacity(style.color[3] / 255)
+                annot.update()
+        if progress:
+            progress(done, len(page_numbers))
+
+def pdf_color(color):
+    """(r, g, b) in the 0-1 range PDF colors use"""
+    r, g, b = color[:3]
+    return (r / 255.0, g / 255.0, b / 255.0)
@@ -1,18 +1,38 @@
 from PyQt5.QtWidgets import (QWidget, QTextEdit, QToolBar, QAction,
                            QFontComboBox, QSpinBox, QComboBox)
 from PyQt5.QtGui import (QTextCharFormat, QFont, QTextCursor, QPalette, QColor,
-                       QPainter, QPen)
-from PyQt5.QtCore import Qt, pyqtSignal, QSize
+                       QPainter, QPen, QTextDocument)
+from PyQt5.QtCore import Qt, pyqtSignal, QSize, QRect, QRectF
+
+class TextItem:
+    """A text box as data: its rectangle in the overlay and its rich text"""
+    __slots__ = ('rect', 'document')
+
+    def __init__(self, rect, document):
+        self.rect = rect
+        self.document = document
 
 class PDFTextEditor(QWidget):
+    """
+    Overlay holding the text boxes placed on the pages.
+
+    Boxes are TextItems painted by the overlay itself, so a form with
+    hundreds of boxes costs hundreds of small documents rather than
+    hundreds of QTextEdit widgets. A single TextBox editor is placed over
+    the box being edited and shares that box's QTextDocument, so edits
+    land in the item directly.
+    """
     textEditingStarted = pyqtSignal()
     textEditingFinished = pyqtSignal()
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.text_boxes = []
-        self.current_text_box = None
-        self.setup_format_toolbar()
+        self.text_items = []
+        self.editing_item = None
+        self.editor = None  # Shared TextBox, created for the first edit
+        self.current_text_box = None  # The editor while a box is being edited
+        # Built on first use: QFontComboBox enumerates every installed font
+        self.format_toolbar = None
         
         # Make the widget transparent for overlaying
         self.setAttribute(Qt.WA_TranslucentBackground)
@@ -94,31 +114,105 @@ class PDFTextEditor(QWidget):
         self.format_toolbar.hide()
 
     def create_text_box(self, pos):
-        """Create a new text box at the given position"""
+        """Create a new text box at the given position and start editing it"""
         if not self.pdf_rect:
             return None
             
-        # Create text box
-        text_box = TextBox(self)
-        text_box.setFont(self.font_family.currentFont())
-        text_box.setFontPointSize(self.font_size.value())
-        text_box.textChanged.connect(self.text_box_changed)
-        text_box.focusReceived.connect(self.text_box_focused)
-        text_box.resizeStarted.connect(lambda: self.textEditingStarted.emit())
-        text_box.resizeFinished.connect(lambda: self.textEditingFinished.emit())
-        
+        # New boxes take the font chosen in the toolbar
+        self.get_toolbar()
+
         # Set initial size and position
         width, height = 200, 100
         x = max(0, min(pos.x() - width/2, self.pdf_rect.width() - width))
         y = max(0, min(pos.y() - height/2, self.pdf_rect.height() - height))
-        text_box.setGeometry(int(x), int(y), width, height)
-        
-        text_box.show()
-        text_box.raise_()  # Ensure it's on top
-        self.text_boxes.append(text_box)
-        self.current_text_box = text_box
+        item = TextItem(QRect(int(x), int(y), width, height), QTextDocument())
+        self.text_items.append(item)
+        self.edit_item(item)
+        self.editor.setCurrentFont(self.font_family.currentFont())
+        self.editor.setFontPointSize(self.font_size.value())
+        return item
+
+    def get_editor(self):
+        """Return the shared editor, creating it on first use"""
+        if self.editor is None:
+            self.editor = TextBox(self)
+            self.editor.textChanged.connect(self.text_box_changed)
+            self.editor.focusReceived.connect(self.text_box_focused)
+            self.editor.resizeStarted.connect(lambda: self.textEditingStarted.emit())
+            self.editor.resizeFinished.connect(lambda: self.textEditingFinished.emit())
+            # Shown between edits, so the editor never writes into an item it has left
+            self.blank_document = QTextDocument(self.editor)
+            self.editor.hide()
+        return self.editor
+
+    def edit_item(self, item):
+        """Place the shared editor over an item and edit its document"""
+        if item is self.editing_item:
+            return
+        self.finish_editing()
+        editor = self.get_editor()
+        self.editing_item = item
+        editor.setDocument(item.document)
+        editor.setGeometry(item.rect)
+        editor.show()
+        editor.raise_()
+        editor.setFocus()
+        self.current_text_box = editor
+        self.update(item.rect)
         self.textEditingStarted.emit()
-        return text_box
+
+    def finish_editing(self):
+        """Take the editor off its item, which is painted by the overlay again"""
+        item = self.editing_item
+        if item is None:
+            return
+        editor = self.editor
+        item.rect = editor.geometry()
+        self.editing_item = None
+        self.current_text_box = None
+        editor.hide()
+        editor.setDocument(self.blank_document)
+        if item.document.isEmpty():
+            self.text_items.remove(item)
+        self.update(item.rect)
+        self.textEditingFinished.emit()
+
+    def item_at(self, pos):
+        """Topmost text item under pos, or None"""
+        for item in reversed(self.text_items):
+            if item.rect.contains(pos):
+                return item
+        return None
+
+    def mousePressEvent(self, event):
+        item = self.item_at(event.pos()) if event.button() == Qt.LeftButton else None
+        if item is not None:
+            self.edit_item(item)
+            self.editor.setTextCursor(self.editor.cursorForPosition(self.editor.mapFrom(self, event.pos())))
+            event.accept()
+        else:
+            # Leave clicks on empty space to the container, which places new boxes
+            self.finish_editing()
+            event.ignore()
+
+    def hideEvent(self, event):
+        self.finish_editing()
+        super().hideEvent(event)
+
+    def paintEvent(self, event):
+        exposed = event.rect()
+        painter = QPainter(self)
+        for item in self.text_items:
+            if item is self.editing_item or not item.rect.intersects(exposed):
+                continue
+            rect = item.rect
+            painter.fillRect(rect, QColor(255, 255, 255, 180))
+            painter.save()
+            painter.translate(rect.topLeft())
+            painter.setClipRect(0, 0, rect.width(), rect.height())
+            item.document.setTextWidth(rect.width())
+            item.document.drawContents(painter, QRectF(0, 0, rect.width(), rect.height()))
+            painter.restore()
 
     def text_box_changed(self):
         """Handle text box content changes"""
@@ -193,15 +287,16 @@ class PDFTextEditor(QWidget):
             self.current_text_box.mergeCurrentCharFormat(format)
 
     def get_toolbar(self):
-        """Return the formatting toolbar"""
+        """Return the formatting toolbar, creating it on first use"""
+        if self.format_toolbar is None:
+            self.setup_format_toolbar()
         return self.format_toolbar
 
     def clear_text_boxes(self):
         """Remove all text boxes"""
-        for text_box in self.text_boxes:
-            text_box.deleteLater()
-        self.text_boxes.clear()
-        self.current_text_box = None
+        self.finish_editing()
+        self.text_items.clear()
+        self.update()
 
 
 class TextBox(QTextEdit):
@@ -337,9 +432,10 @@ class TextBox(QTextEdit):
         super().paintEvent(event)
         # Draw resize handles
         if self.hasFocus():
-            p = QPainter(self)
+            # A QTextEdit paints on its viewport, not on itself
+            p = QPainter(self.viewport())
             p.setPen(QPen(QColor(0, 120, 215), 1))  # Windows-style blue handles
-            rect = self.rect()
+            rect = self.viewport().rect()
             
             # Draw corner handles
             handle_size = self.edge_size
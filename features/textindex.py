@@ -0,0 +1,211 @@
+# Full-text search index of a document. Nothing here imports Qt, so the
+# index is built by a worker process and searched by the GUI alike.
+from array import array
+import bisect
+import itertools
+import os
+import pickle
+import re
+import zlib
+
+# Bump when tokenizing or the file layout changes
+INDEX_VERSION = 1
+TOKEN = re.compile(r"\w+")
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+class TextIndex:
+    """
+    Inverted word index of a document.
+
+    Every token of every word gets a position; positions run on across
+    pages in the order pages were added. postings maps a token to an
+    array of its positions, rects holds the word rectangle (in unrotated
+    PDF coordinates) of each position, and page_starts/page_numbers map a
+    position back to its page. A query looks its terms up in postings and
+    checks that they follow each other, instead of scanning page text, and
+    the last term matches as a prefix so results appear while typing.
+    """
+    def __init__(self, page_count=0):
+        self.page_count = page_count
+        self.postings = {}  # Token -> array('I') of positions
+        self.rects = array('f')  # x0, y0, x1, y1 of each position
+        self.page_starts = array('I')  # First position of each indexed page, ascending
+        self.page_numbers = array('I')  # Page number of each entry in page_starts
+        self.indexed = set()
+        self.vocabulary = None  # Sorted tokens for prefix lookups, built on the first one
+        self.memo = {}  # Positions looked up by the last query, kept while typing it
+
+    @property
+    def positions(self):
+        return len(self.rects) // 4
+
+    def is_complete(self):
+        return len(self.indexed) >= self.page_count
+
+    def add_page(self, number, tokens, rects):
+        """Index the tokens of a page with their word rects, as made by page_tokens"""
+        if number in self.indexed:
+            return
+        self.indexed.add(number)
+        self.page_starts.append(self.positions)
+        self.page_numbers.append(number)
+        postings = self.postings
+        vocabulary = self.vocabulary
+        for position, token in enumerate(tokens, self.positions):
+            found = postings.get(token)
+            if found is None:
+                found = postings[token] = array('I')
+                if vocabulary is not None:
+                    bisect.insort(vocabulary, token)
+            found.append(position)
+        self.rects.extend(rects)
+        self.memo = {}
+
+    def page_of(self, position):
+        return self.page_numbers[bisect.bisect_right(self.page_starts, position) - 1]
+
+    def rect(self, position):
+        return tuple(self.rects[position * 4:position * 4 + 4])
+
+    def prefix_positions(self, prefix):
+        """Ascending positions of every token starting with prefix"""
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        # Tokens with the prefix sit together in the sorted vocabulary
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        end = bisect.bisect_left(self.vocabulary, prefix + "\U0010ffff", start)
+        found = [self.postings[token] for token in self.vocabulary[start:end]]
+        if len(found) == 1:
+            return found[0]
+        # Each postings array is ascending, so this only merges sorted runs
+        return array('I', sorted(itertools.chain.from_iterable(found)))
+
+    def lookup(self, kind, term, memo):
+        """
+        Positions of term as kind: 'word', 'prefix', or 'set' and 'prefix set'
+        for membership tests. Reuses the last query's lookups until pages are
+        added, and records this one's in memo for the next query.
+        """
+        key = (kind, term)
+        found = self.memo.get(key)
+        if found is None:
+            if kind == 'prefix':
+                found = self.prefix_positions(term)
+            elif kind == 'prefix set':
+                found = set(self.lookup('prefix', term, memo))
+            elif kind == 'set':
+                found = set(self.postings.get(term, ()))
+            else:
+                found = self.postings.get(term, ())
+        memo[key] = found
+        return found
+
+    def search(self, query, prefix=True, limit=10000):
+        """
+        Find a word or phrase, ignoring case and punctuation.
+
+        Returns up to limit hits as (page number, [rect, ...]) with one rect
+        per matched word, in page order. With prefix the last term also
+        matches longer words, as wanted while the query is being typed.
+        """
+        terms = tokenize(query)
+        if not terms:
+            return []
+        memo = {}
+        if len(terms) == 1:
+            starts = self.lookup('prefix' if prefix else 'word', terms[0], memo)
+        else:
+            starts = self.lookup('word', terms[0], memo)
+            # Each later term has to sit right after the one before it
+            following = [self.lookup('set', term, memo) for term in terms[1:-1]]
+            if prefix:
+                following.append(self.lookup('prefix set', terms[-1], memo))
+            else:
+                following.append(self.lookup('set', terms[-1], memo))
+            for offset, positions in enumerate(following, 1):
+                starts = [start for start in starts if start + offset in positions]
+        self.memo = memo
+
+        hits = []
+        rects = self.rects
+        length = len(terms)
+        page_end = 0  # Starts ascend, so the page only changes past the end of the last one
+        for start in starts:
+            if start >= page_end:
+                index = bisect.bisect_right(self.page_starts, start)
+                page = self.page_numbers[index - 1]
+                page_end = self.page_starts[index] if index < len(self.page_starts) else self.positions
+            if start + length > page_end:
+                continue  # Phrase continued on the next page
+            words = iter(rects[start * 4:(start + length) * 4])
+            hits.append((page, list(zip(words, words, words, words))))
+            if len(hits) >= limit:
+                break
+        # Pages may have been indexed out of order
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def save(self, path, fingerprint):
+        """Write the index under a temporary name and rename it"""
+        data = (INDEX_VERSION, fingerprint, self.page_count, self.postings, self.rects,
+                self.page_starts, self.page_numbers)
+        part_path = f"{path}.{os.getpid()}.part"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(part_path, 'wb') as f:
+            f.write(zlib.compress(pickle.dumps(data, pickle.HIGHEST_PROTOCOL), 1))
+        os.replace(part_path, path)
+
+    @classmethod
+    def load(cls, path, fingerprint):
+        """The index saved at path for a file with fingerprint, or None"""
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.loads(zlib.decompress(f.read()))
+        except (OSError, zlib.error, pickle.UnpicklingError, EOFError):
+            return None
+        if data[0] != INDEX_VERSION or data[1] != fingerprint:
+            return None
+        index = cls(data[2])
+        index.postings, index.rects, index.page_starts, index.page_numbers = data[3:]
+        index.indexed = set(index.page_numbers)
+        return index
+
+def page_tokens(page):
+    """
+    Tokens of every word on a fitz.Page and an array('f') with the word's
+    rect for each token, ready for TextIndex.add_page.
+    """
+    tokens = []
+    rects = array('f')
+    for word in page.get_text("words"):
+        for token in tokenize(word[4]):
+            tokens.append(token)
+            rects.extend(word[:4])
+    return tokens, rects
+
+def index_in_worker(path, messages, cancel_event, first_page=0, batch_size=20):
+    """
+    Extract the words of every page and send them back in batches.
+
+    Runs in a separate process. Pages are sent from first_page on and then
+    from the start, so the pages the user is looking at become searchable
+    first. Words are tokenized here, leaving the GUI only the postings to
+    update. Messages are ('pages', [(page number, tokens, rects), ...]) and
+    finally ('done',), ('cancelled',) or ('error', message).
+    """
+    import fitz  # PyMuPDF
+    try:
+        with fitz.open(path) as doc:
+            count = doc.page_count
+            order = list(range(first_page, count)) + list(range(min(first_page, count)))
+            for start in range(0, len(order), batch_size):
+                if cancel_event.is_set():
+                    messages.put(('cancelled',))
+                    return
+                batch = [(number, *page_tokens(doc.load_page(number))) for number in order[start:start + batch_size]]
+                messages.put(('pages', batch))
+        messages.put(('done',))
+    except Exception as e:
+        messages.put(('error', str(e)))
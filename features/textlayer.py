@@ -0,0 +1,104 @@
+# Word boxes of pages for text selection and copying. Nothing here imports
+# Qt; all coordinates are unrotated PDF coordinates, so they hold at any zoom.
+from collections import OrderedDict
+import math
+
+from .metrics import metrics
+
+class PageText:
+    """
+    Words of one page with a uniform grid over them for hit-testing.
+
+    words are (x0, y0, x1, y1, text, block, line, word) tuples as returned
+    by page.get_text("words"), in reading order. Every grid cell lists the
+    words overlapping it, so a point or rectangle query only looks at the
+    few words near it instead of every word on the page.
+    """
+    def __init__(self, words, cell_size=32.0):
+        self.words = words
+        self.cell_size = cell_size
+        self.grid = {}  # (column, row) -> indices of words overlapping the cell
+        for index, word in enumerate(words):
+            for cell in self.cells(*word[:4]):
+                self.grid.setdefault(cell, []).append(index)
+
+    def cells(self, x0, y0, x1, y1):
+        size = self.cell_size
+        return [(column, row)
+                for row in range(math.floor(y0 / size), math.floor(y1 / size) + 1)
+                for column in range(math.floor(x0 / size), math.floor(x1 / size) + 1)]
+
+    def word_at(self, x, y):
+        """Index of the word containing the point, or -1"""
+        cell = (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+        for index in self.grid.get(cell, ()):
+            x0, y0, x1, y1 = self.words[index][:4]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                return index
+        return -1
+
+    def nearest_word(self, x, y, max_distance=64.0):
+        """Index of the word closest to the point within max_distance, or -1"""
+        size = self.cell_size
+        column, row = math.floor(x / size), math.floor(y / size)
+        best, best_distance = -1, max_distance
+        # Search rings of cells outwards until no closer word can be found
+        for ring in range(int(max_distance / size) + 2):
+            if best >= 0 and (ring - 1) * size > best_distance:
+                break
+            for cell_row in range(row - ring, row + ring + 1):
+                for cell_column in range(column - ring, column + ring + 1):
+                    if max(abs(cell_row - row), abs(cell_column - column)) != ring:
+                        continue
+                    for index in self.grid.get((cell_column, cell_row), ()):
+                        x0, y0, x1, y1 = self.words[index][:4]
+                        distance = math.hypot(max(x0 - x, 0, x - x1), max(y0 - y, 0, y - y1))
+                        if distance < best_distance or (distance == best_distance and index < best):
+                            best, best_distance = index, distance
+        return best
+
+    def words_in_rect(self, x0, y0, x1, y1):
+        """Indices of the words overlapping a rectangle, in reading order"""
+        found = set()
+        for cell in self.cells(x0, y0, x1, y1):
+            for index in self.grid.get(cell, ()):
+                wx0, wy0, wx1, wy1 = self.words[index][:4]
+                if wx0 <= x1 and wx1 >= x0 and wy0 <= y1 and wy1 >= y0:
+                    found.add(index)
+        return sorted(found)
+
+    def text(self, indices):
+        """Text of the words at indices, with line breaks where their lines change"""
+        parts = []
+        previous = None
+        for index in indices:
+            word = self.words[index]
+            if previous is not None:
+                parts.append(" " if word[5:7] == previous[5:7] else "\n")
+            parts.append(word[4])
+            previous = word
+        return "".join(parts)
+
+class TextLayer:
+    """
+    PageText of the pages of a DocumentSession, extracted on first use.
+
+    Only the pages the user points at are extracted, and at most max_pages
+    of them are kept.
+    """
+    def __init__(self, session, max_pages=32):
+        self.session = session
+        self.max_pages = max_pages
+        self.pages = OrderedDict()  # Page index -> PageText, oldest first
+
+    def page(self, number):
+        page_text = self.pages.get(number)
+        if page_text is not None:
+            self.pages.move_to_end(number)
+            return page_text
+        with metrics.timer('textlayer.extract'):
+            page_text = PageText(self.session.page(number).get_text("words"))
+        self.pages[number] = page_text
+        while len(self.pages) > self.max_pages:
+            self.pages.popitem(last=False)
+        return page_text
@@ -0,0 +1,262 @@
+from PyQt5.QtWidgets import QListView, QStyledItemDelegate, QStyle, QAbstractItemView
+from PyQt5.QtGui import QImage, QColor, QPen
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QPoint, QRect, QSize, QTimer, pyqtSignal
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+
+from .renderer import BufferImage
+from .metrics import metrics
+
+class ThumbnailModel(QAbstractListModel):
+    """
+    One row per page of the open document.
+
+    Rows hold nothing but their page size until the view paints them; a
+    painted row without a thumbnail asks the panel to render one.
+    """
+    def __init__(self, panel):
+        super().__init__(panel)
+        self.panel = panel
+        self.page_sizes = []  # (width, height) of each page in PDF points
+
+    def set_pages(self, page_sizes):
+        self.beginResetModel()
+        self.page_sizes = list(page_sizes)
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.page_sizes)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole:
+            return str(index.row() + 1)
+        return None
+
+class ThumbnailDelegate(QStyledItemDelegate):
+    """Draws a page's thumbnail, or a blank page until it is rendered, above its number"""
+    def __init__(self, panel):
+        super().__init__(panel)
+        self.panel = panel
+
+    def sizeHint(self, option, index):
+        return self.panel.cell_size()
+
+    def paint(self, painter, option, index):
+        panel = self.panel
+        row = index.row()
+        if option.state & QStyle.State_Selected:
+            painter.fillRect(option.rect, option.palette.highlight())
+
+        width, height = panel.model.page_sizes[row]
+        box = QSize(panel.thumbnail_width, panel.thumbnail_box_height())
+        size = QSize(int(width), int(height)).scaled(box, Qt.KeepAspectRatio)
+        rect = QRect(option.rect.left() + (option.rect.width() - size.width()) // 2,
+                     option.rect.top() + panel.padding + (box.height() - size.height()) // 2,
+                     size.width(), size.height())
+        image = panel.thumbnail(row)
+        if image is not None:
+            painter.drawImage(rect, image)
+        else:
+            painter.fillRect(rect, Qt.white)
+        painter.setPen(QPen(QColor(160, 160, 160), 1))
+        painter.drawRect(rect.adjusted(0, 0, -1, -1))
+
+        text_rect = QRect(option.rect.left(), option.rect.top() + panel.padding + box.height(),
+                          option.rect.width(), option.rect.bottom() - panel.padding - box.height() - option.rect.top())
+        painter.setPen(option.palette.color(
+            option.palette.HighlightedText if option.state & QStyle.State_Selected else option.palette.Text))
+        painter.drawText(text_rect, Qt.AlignCenter, str(row + 1))
+
+class ThumbnailPanel(QListView):
+    """
+    Sidebar of page thumbnails for navigating long documents.
+
+    Thumbnails are rendered at low resolution in a worker process, in
+    batches so a batch costs one round trip, and only for rows the view
+    actually paints. Pending rows are submitted visible first, then one
+    batch below the viewport is read ahead. Rows scrolled away before their
+    batch was sent are dropped, so flinging through a 2000-page document
+    renders only where it stops. At
+    most max_in_flight batches are queued at once. Rendered thumbnails are
+    kept in a bounded LRU, and the worker stores them in the disk cache when
+    one is set, so reopening a document does not render them again.
+
+    If the worker dies, a fresh one is started and the rows of the lost
+    batch are rendered again one at a time, so only a page that crashes the
+    worker again is given up on. renderFailed reports such pages.
+    """
+    pageSelected = pyqtSignal(int)
+    renderFailed = pyqtSignal(str)
+    _batchReady = pyqtSignal(object, object)  # generation, future
+
+    def __init__(self, parent=None, thumbnail_width=120, batch_size=8, max_in_flight=2, max_cached=500):
+        super().__init__(parent)
+        self.thumbnail_width = thumbnail_width
+        self.batch_size = batch_size
+        self.max_in_flight = max_in_flight
+        self.max_cached = max_cached
+        self.padding = 6
+        self.path = None
+        self.generation = 0  # Bumped per document so late batches of the previous one are dropped
+        self.thumbnails = OrderedDict()  # Page index -> QImage, oldest first
+        self.wanted = set()  # Painted rows without a thumbnail, not submitted yet
+        self.submitted = set()
+        self.retry_rows = set()  # Rows of a batch lost with its worker, rendered alone next time
+        self.failed_rows = set()  # Rows that could not be rendered; painted without a thumbnail
+        self.in_flight = 0
+        self.executor = None
+        self.disk_cache = None  # Optional (directory, max bytes) of a DiskRenderCache for the worker
+
+        self.model = ThumbnailModel(self)
+        self.setModel(self.model)
+        self.setItemDelegate(ThumbnailDelegate(self))
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setFixedWidth(self.cell_size().width() + self.verticalScrollBar().sizeHint().width() + 4)
+        self.clicked.connect(lambda index: self.pageSelected.emit(index.row()))
+
+        # Collect the rows requested during one paint into a single submission
+        self.submit_timer = QTimer(self)
+        self.submit_timer.setSingleShot(True)
+        self.submit_timer.setInterval(0)
+        self.submit_timer.timeout.connect(self.submit_batches)
+
+        self._batchReady.connect(self.on_batch_ready)
+
+    def thumbnail_box_height(self):
+        return int(self.thumbnail_width * 1.5)
+
+    def cell_size(self):
+        text_height = self.fontMetrics().lineSpacing()
+        return QSize(self.thumbnail_width + 2 * self.padding,
+                     self.thumbnail_box_height() + text_height + 3 * self.padding)
+
+    def set_document(self, path, page_sizes):
+        """Show the pages of a document, or nothing for path None"""
+        self.generation += 1
+        self.path = path
+        self.thumbnails.clear()
+        self.wanted.clear()
+        self.submitted.clear()
+        self.retry_rows.clear()
+        self.failed_rows.clear()
+        self.model.set_pages(page_sizes if path else [])
+
+    def set_current_page(self, index):
+        """Select a page's row without emitting pageSelected"""
+        if 0 <= index < self.model.rowCount():
+            model_index = self.model.index(index)
+            if self.currentIndex() != model_index:
+                self.setCurrentIndex(model_index)
+                self.scrollTo(model_index)
+
+    def thumbnail(self, row):
+        """Thumbnail of a page, or None after queuing it for rendering"""
+        image = self.thumbnails.get(row)
+        if image is not None:
+            self.thumbnails.move_to_end(row)
+            return image
+        if row not in self.submitted and row not in self.failed_rows:
+            self.wanted.add(row)
+            self.submit_timer.start()
+        return None
+
+    def visible_rows(self):
+        """Range of rows shown in the viewport"""
+        rows = self.model.rowCount()
+        if not rows:
+            return range(0)
+        x = self.viewport().width() // 2
+        top = self.indexAt(QPoint(x, 0))
+        bottom = self.indexAt(QPoint(x, self.viewport().height() - 1))
+        first = top.row() if top.isValid() else 0
+        last = bottom.row() if bottom.isValid() else rows - 1
+        return range(first, last + 1)
+
+    def submit_batches(self):
+        """Send wanted rows to the worker, visible rows first, then the next rows down"""
+        if not self.path:
+            return
+        visible = self.visible_rows()
+        # Rows painted earlier but scrolled away since are not worth rendering
+        self.wanted.intersection_update(visible)
+        queue = sorted(self.wanted)
+        if visible:
+            # Once the viewport is covered, read ahead one batch below it
+            ahead = range(visible.stop, min(self.model.rowCount(), visible.stop + self.batch_size))
+            queue.extend(row for row in ahead if row not in self.thumbnails and row not in self.submitted
+                         and row not in self.failed_rows)
+        while queue and self.in_flight < self.max_in_flight:
+            size = 1 if queue[0] in self.retry_rows else self.batch_size
+            rows, queue = queue[:size], queue[size:]
+            self.wanted.difference_update(rows)
+            self.submitted.update(rows)
+            from . import rasterizer  # Imports PyMuPDF, so only once there is something to render
+            args = (rasterizer.render_thumbnails, self.path, rows, self.thumbnail_width, self.disk_cache)
+            try:
+                future = self.get_executor().submit(*args)
+            except BrokenProcessPool:
+                # The worker died since the last batch; start a fresh one
+                self.executor = None
+                future = self.get_executor().submit(*args)
+            future.rows = rows
+            future.executor = self.executor
+            self.in_flight += 1
+            metrics.count('thumbnails.batches')
+            # Results arrive on an executor thread; hop back to the GUI thread
+            future.add_done_callback(lambda f, generation=self.generation: self._batchReady.emit(generation, f))
+
+    def get_executor(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+        return self.executor
+
+    def on_batch_ready(self, generation, future):
+        self.in_flight -= 1
+        error = None if future.cancelled() else future.exception()
+        if isinstance(error, BrokenProcessPool) and future.executor is self.executor:
+            # Batches still queued in the dead pool fail the same way; only replace it once
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+        if generation == self.generation:
+            self.submitted.difference_update(future.rows)
+            self.retry_rows.difference_update(future.rows)
+            if future.cancelled():
+                pass
+            elif error is None:
+                for row, width, height, stride, samples in future.result():
+                    self.thumbnails[row] = BufferImage(samples, samples, width, height, stride, QImage.Format_RGB888)
+                    self.update(self.model.index(row))
+                while len(self.thumbnails) > self.max_cached:
+                    self.thumbnails.popitem(last=False)
+            elif isinstance(error, BrokenProcessPool) and len(future.rows) > 1:
+                # Render the lost rows again one by one to find the page that killed the worker
+                self.retry_rows.update(future.rows)
+                self.wanted.update(future.rows)
+            else:
+                self.failed_rows.update(future.rows)
+                metrics.count('thumbnails.failed', len(future.rows))
+                pages = ", ".join(str(row + 1) for row in future.rows)
+                plural = "s" if len(future.rows) > 1 else ""
+                self.renderFailed.emit(f"Could not render the thumbnail{plural} of page{plural} {pages}: {error}")
+        self.submit_batches()
+
+    def recycle(self):
+        """
+        Stop the worker and wait for it to exit, like PDFRenderer.recycle.
+        Nothing more is rendered until the next set_document.
+        """
+        self.path = None
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+    def shutdown(self):
+        self.generation += 1
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
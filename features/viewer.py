@@ -1,22 +1,30 @@
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QFileDialog, QAction, 
-                            QLabel, QVBoxLayout, QWidget, QScrollArea, QMessageBox,
-                            QToolBar, QStyle, QColorDialog)
-from PyQt5.QtGui import QPixmap, QImage, QIcon
-from PyQt5.QtCore import Qt, QRect, QSize
-import os
-from PyQt5.QtWidgets import (QApplication, QMainWindow, QFileDialog, QAction, 
-                            QLabel, QVBoxLayout, QWidget, QScrollArea, QMessageBox,
-                            QToolBar, QStyle)
+                            QLabel, QVBoxLayout, QHBoxLayout, QWidget, QScrollArea, QMessageBox,
+                            QToolBar, QStyle, QColorDialog, QProgressBar, QToolButton, QActionGroup)
 from PyQt5.QtGui import QPixmap, QImage, QIcon, QCursor
-from PyQt5.QtCore import Qt, QRect, QSize
+from PyQt5.QtCore import Qt, QRect, QSize, QSettings, QStandardPaths, QTimer, QEvent, QPointF, pyqtSignal
+import os
+import threading
 
-import fitz  # PyMuPDF
+# PyMuPDF is not imported here: importing it takes about as long as the rest
+# of startup, so it is loaded in the background once the window is shown
 from .annotator import PDFAnnotator
 from .zoom import PDFZoomHandler
 from .texteditor import PDFTextEditor
 from .recentfiles import RecentFilesManager
+from .pageview import PDFPageView
+from .renderer import PDFRenderer
+from .rendercache import RenderCache
+from .backgroundsave import BackgroundSave
+from .metrics import metrics
+from .hud import PerformanceHUD
+from .thumbnails import ThumbnailPanel
+from .findbar import FindBar
+from .search import DocumentSearch
 
 class PDFViewer(QMainWindow):
+    modulesPreloaded = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("PDF Viewer")
@@ -27,10 +35,11 @@ class PDFViewer(QMainWindow):
         self.recent_files_manager = RecentFilesManager()
 
         # Initialize variables
-        self.current_doc = None
+        self.session = None  # DocumentSession of the open file
+        self.background_save = None  # BackgroundSave while a save is running
+        self.saving_strokes = []  # (stroke, state) of the strokes included in the running save
         self.annotation_mode = False
         self.text_mode = False
-        self.pdf_pixmap = None
 
         # Create central widget
         self.central_widget = QWidget()
@@ -40,6 +49,17 @@ class PDFViewer(QMainWindow):
         # Initialize zoom handler
         self.zoom_handler = PDFZoomHandler(self)
 
+        # Rendered pages shared by the page view and the zoom handler
+        cache_mb = int(QSettings('PeeDoFile', 'PDFViewer').value('renderCacheMB', 256))
+        self.render_cache = RenderCache(cache_mb * 1024 * 1024)
+        self.zoom_handler.render_cache = self.render_cache
+        cache_root = os.path.join(
+            QStandardPaths.writableLocation(QStandardPaths.CacheLocation) or os.path.expanduser('~/.cache'),
+            'PeeDoFile')
+        self.disk_cache_dir = os.path.join(cache_root, 'renders')
+        self.search_cache_dir = os.path.join(cache_root, 'search')
+        self.search = None  # DocumentSearch of the open file, started with the find bar
+
         # Create scroll area
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidgetResizable(True)
@@ -49,10 +69,15 @@ class PDFViewer(QMainWindow):
         self.container_layout = QVBoxLayout(self.container)
         self.container_layout.setContentsMargins(0, 0, 0, 0)
         
-        # Create the PDF display label
-        self.label = QLabel("Open a PDF file to view.")
-        self.label.setAlignment(Qt.AlignCenter)
-        self.container_layout.addWidget(self.label)
+        # Create the continuous page view
+        self.page_view = PDFPageView(self.container)
+        self.page_view.image_provider = self.zoom_handler.get_zoomed_image
+        self.renderer = PDFRenderer(self)
+        self.page_view.set_renderer(self.renderer)
+        self.page_view.render_cache = self.render_cache
+        self.page_view.set_scale(self.zoom_handler.zoom_factor * 2)
+        self.page_view.layoutChanged.connect(self.update_overlay_geometry)
+        self.container_layout.addWidget(self.page_view)
         
         # Initialize text editor
         self.text_editor = PDFTextEditor(self.container)
@@ -62,17 +87,62 @@ class PDFViewer(QMainWindow):
         
         # Create and add annotator widget
         self.annotator = PDFAnnotator(self.container)
+        self.annotator.set_page_view(self.page_view)
         self.annotator.hide()  # Initially hidden
         
-        # Set up scroll area
+        # Set up scroll area next to the page thumbnails
         self.scroll_area.setWidget(self.container)
-        self.main_layout.addWidget(self.scroll_area)
+        self.thumbnail_panel = ThumbnailPanel()
+        self.thumbnail_panel.pageSelected.connect(self.scroll_to_page)
+        self.thumbnail_panel.renderFailed.connect(lambda message: self.statusBar().showMessage(message, 5000))
+        self.find_bar = FindBar()
+        self.find_bar.queryChanged.connect(self.run_search)
+        self.find_bar.currentHitChanged.connect(self.show_search_hit)
+        self.find_bar.closed.connect(self.on_find_bar_closed)
+        # Hits are refreshed at most this often while indexing adds pages
+        self.search_refresh_timer = QTimer(self)
+        self.search_refresh_timer.setSingleShot(True)
+        self.search_refresh_timer.setInterval(300)
+        self.search_refresh_timer.timeout.connect(self.refresh_search_hits)
+        self.find_bar.hide()
+        self.main_layout.addWidget(self.find_bar)
+        self.content_layout = QHBoxLayout()
+        self.content_layout.addWidget(self.thumbnail_panel)
+        self.content_layout.addWidget(self.scroll_area)
+        self.main_layout.addLayout(self.content_layout)
+
+        # Render newly exposed pages whenever the viewport moves
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.page_view.schedule_visible_update)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.update_current_thumbnail)
+        self.scroll_area.horizontalScrollBar().valueChanged.connect(self.page_view.schedule_visible_update)
 
         # Install event filter for text editing
         self.container.installEventFilter(self)
+        # Ctrl+wheel and pinches over the pages zoom instead of scrolling
+        self.scroll_area.viewport().installEventFilter(self)
+        self.scroll_area.viewport().grabGesture(Qt.PinchGesture)
         
         # Create menu bar
         self.create_menu_bar()
+        self.create_save_progress()
+
+        # Memory held for rendering, reported with the timings
+        self.register_gauges()
+        self.hud = PerformanceHUD(self.scroll_area.viewport())
+        if os.environ.get('PEEDOFILE_HUD'):
+            self.hud_action.setChecked(True)
+
+        # Load PyMuPDF and start a render worker once the window is up
+        self.modulesPreloaded.connect(self.renderer.warm_up)
+        QTimer.singleShot(0, self.start_preload)
+
+    def start_preload(self):
+        threading.Thread(target=self.preload_modules, daemon=True).start()
+
+    def preload_modules(self):
+        """Import the document modules off the GUI thread so opening a file does not wait for them"""
+        from . import session, saver, rasterizer
+        self.modulesPreloaded.emit()
 
     def create_menu_bar(self):
         # Create menu bar
@@ -95,10 +165,25 @@ class PDFViewer(QMainWindow):
         # Add actions to File menu
         file_menu.addAction(self.open_action)
         file_menu.addAction(self.save_action)
+
+        # Choose between editable ink annotations and strokes merged into the pages
+        self.flatten_action = QAction("Flatten Annotations on Save", self)
+        self.flatten_action.setCheckable(True)
+        self.flatten_action.setChecked(QSettings('PeeDoFile', 'PDFViewer').value('flattenAnnotations', False, type=bool))
+        self.annotator.flatten = self.flatten_action.isChecked()
+        self.flatten_action.toggled.connect(self.set_flatten_annotations)
+        file_menu.addAction(self.flatten_action)
         
         # Add recent files menu
         self.recent_files_menu = file_menu.addMenu("Recent Files")
+        self.recent_files_menu.setStyleSheet("QMenu { icon-size: 48px; }")  # Room for thumbnails
+        # Entries are checked and thumbnailed in the background; the menu is
+        # rebuilt from cached results whenever some arrive
+        self.recent_files_manager.filesChanged.connect(self.update_recent_files_menu)
+        self.recent_files_menu.aboutToShow.connect(self.recent_files_manager.validate)
         self.update_recent_files_menu()
+        # The first check waits for the preload, as thumbnails need PyMuPDF
+        self.modulesPreloaded.connect(lambda: self.recent_files_manager.validate())
         
         # Add clear recent files action
         file_menu.addSeparator()
@@ -106,6 +191,43 @@ class PDFViewer(QMainWindow):
         clear_recent_action.triggered.connect(self.clear_recent_files)
         file_menu.addAction(clear_recent_action)
 
+        # Edit menu for copying and searching text
+        edit_menu = menubar.addMenu("&Edit")
+        copy_action = QAction("&Copy", self)
+        copy_action.setShortcut("Ctrl+C")
+        copy_action.triggered.connect(self.copy_selected_text)
+        edit_menu.addAction(copy_action)
+        find_action = QAction("&Find...", self)
+        find_action.setShortcut("Ctrl+F")
+        find_action.triggered.connect(self.open_find_bar)
+        edit_menu.addAction(find_action)
+
+        # View menu with the performance tools
+        view_menu = menubar.addMenu("&View")
+        self.hud_action = QAction("Performance Overlay", self)
+        self.hud_action.setShortcut("Ctrl+Shift+P")
+        self.hud_action.setCheckable(True)
+        self.hud_action.toggled.connect(lambda checked: self.hud.set_enabled(checked))
+        view_menu.addAction(self.hud_action)
+        self.thumbnails_action = QAction("Page Thumbnails", self)
+        self.thumbnails_action.setShortcut("F4")
+        self.thumbnails_action.setCheckable(True)
+        self.thumbnails_action.setChecked(QSettings('PeeDoFile', 'PDFViewer').value('showThumbnails', True, type=bool))
+        self.thumbnail_panel.setVisible(self.thumbnails_action.isChecked())
+        self.thumbnails_action.toggled.connect(self.set_thumbnails_visible)
+        view_menu.addAction(self.thumbnails_action)
+        dump_metrics_action = QAction("Save Performance Metrics...", self)
+        dump_metrics_action.setShortcut("Ctrl+Shift+M")
+        dump_metrics_action.triggered.connect(self.dump_metrics)
+        view_menu.addAction(dump_metrics_action)
+        view_menu.addSeparator()
+        self.disk_cache_action = QAction("Keep Rendered Pages on Disk", self)
+        self.disk_cache_action.setCheckable(True)
+        self.disk_cache_action.setChecked(QSettings('PeeDoFile', 'PDFViewer').value('diskCache', True, type=bool))
+        self.set_disk_cache(self.disk_cache_action.isChecked())
+        self.disk_cache_action.toggled.connect(self.set_disk_cache)
+        view_menu.addAction(self.disk_cache_action)
+
         # Create toolbar
         toolbar = QToolBar()
         toolbar.setIconSize(QSize(24, 24))
@@ -129,6 +251,20 @@ class PDFViewer(QMainWindow):
         self.color_action.setIcon(self.style().standardIcon(QStyle.SP_DialogHelpButton))
         self.color_action.triggered.connect(self.choose_annotation_color)
         toolbar.addAction(self.color_action)
+
+        # Pen, eraser and selection tools of annotation mode
+        self.annotation_tool_group = QActionGroup(self)
+        for tool, text, tip in (('pen', "Pen", "Draw strokes"),
+                                ('eraser', "Eraser", "Erase whole strokes"),
+                                ('select', "Select", "Lasso strokes (Shift for a rectangle) to move, "
+                                                     "recolor or delete them")):
+            action = QAction(text, self)
+            action.setToolTip(tip)
+            action.setCheckable(True)
+            action.setChecked(tool == self.annotator.tool)
+            action.triggered.connect(lambda checked, tool=tool: self.annotator.set_tool(tool))
+            self.annotation_tool_group.addAction(action)
+            toolbar.addAction(action)
         
         # Add clear annotations action to toolbar
         self.clear_annotations_action = QAction("Clear Annotations", self)
@@ -144,16 +280,24 @@ class PDFViewer(QMainWindow):
         self.toggle_text_action.triggered.connect(self.toggle_text_mode)
         toolbar.addAction(self.toggle_text_action)
 
-        # Add text formatting toolbar (hidden by default)
-        self.format_toolbar = self.text_editor.get_toolbar()
-        self.format_toolbar.hide()
-        toolbar.addSeparator()
-        toolbar.addWidget(self.format_toolbar)
+        # The text formatting toolbar goes between these separators once text
+        # mode is first used (see get_format_toolbar)
+        self.main_toolbar = toolbar
+        self.format_toolbar = None
         toolbar.addSeparator()
+        self.format_toolbar_position = toolbar.addSeparator()
 
         # Add zoom controls to toolbar
         toolbar.addWidget(self.zoom_handler.get_widget())
 
+    def get_format_toolbar(self):
+        """Add the text formatting toolbar to the main toolbar on first use"""
+        if self.format_toolbar is None:
+            self.format_toolbar = self.text_editor.get_toolbar()
+            self.format_toolbar.hide()
+            self.main_toolbar.insertWidget(self.format_toolbar_position, self.format_toolbar)
+        return self.format_toolbar
+
     def toggle_annotation_mode(self):
         if not self.current_file_path:
             QMessageBox.warning(self, "Warning", "Please open a PDF file first.")
@@ -168,16 +312,120 @@ class PDFViewer(QMainWindow):
             self.update_annotator_geometry()
 
     def update_annotator_geometry(self):
-        if self.pdf_pixmap and self.annotation_mode:
-            # Get the geometry of the label with the PDF
-            pdf_rect = self.label.geometry()
-            # Set the annotator to cover exactly the same area as the PDF
+        if self.page_view.page_count() and self.annotation_mode:
+            # Get the geometry of the page view
+            pdf_rect = self.page_view.geometry()
+            # Set the annotator to cover exactly the same area as the pages
             self.annotator.setGeometry(pdf_rect)
             # Update the PDF boundaries in the annotator
             self.annotator.set_pdf_rect(pdf_rect)
             # Ensure annotator is on top
             self.annotator.raise_()
 
+    def update_overlay_geometry(self):
+        """Keep the annotation and text overlays aligned with the page view"""
+        if self.annotation_mode:
+            self.update_annotator_geometry()
+        if self.text_mode:
+            self.update_text_editor_geometry()
+
+    def set_flatten_annotations(self, flatten):
+        self.annotator.flatten = flatten
+        QSettings('PeeDoFile', 'PDFViewer').setValue('flattenAnnotations', flatten)
+
+    def set_disk_cache(self, enabled):
+        """Look up and store renders in the on-disk cache, which outlives the session"""
+        settings = QSettings('PeeDoFile', 'PDFViewer')
+        settings.setValue('diskCache', enabled)
+        disk_cache = None
+        if enabled:
+            disk_cache = (self.disk_cache_dir, int(settings.value('diskCacheMB', 512)) * 1024 * 1024)
+        self.renderer.disk_cache = disk_cache
+        self.zoom_handler.disk_cache = disk_cache
+        self.thumbnail_panel.disk_cache = disk_cache
+
+    def set_thumbnails_visible(self, visible):
+        self.thumbnail_panel.setVisible(visible)
+        QSettings('PeeDoFile', 'PDFViewer').setValue('showThumbnails', visible)
+
+    def copy_selected_text(self):
+        """Copy the text selected in the page view to the clipboard"""
+        text = self.page_view.selected_text()
+        if text:
+            QApplication.clipboard().setText(text)
+
+    def open_find_bar(self):
+        self.find_bar.open_bar()
+        self.start_search()
+
+    def start_search(self):
+        """Start indexing the open file for search unless that has begun already"""
+        if self.search is None and self.session:
+            pages = self.page_view.visible_pages()
+            self.search = DocumentSearch(self.session.path, self.session.page_count, self.search_cache_dir,
+                                         pages[0] if pages else 0, self)
+            self.search.indexUpdated.connect(self.on_search_index_updated)
+            self.search.start()
+
+    def reset_search(self):
+        """Forget the index and hits after the open file changed"""
+        if self.search is not None:
+            self.search.stop()
+            self.search.deleteLater()
+            self.search = None
+        self.search_refresh_timer.stop()
+        self.find_bar.set_hits([])
+        self.page_view.set_highlights([])
+        if self.find_bar.isVisible():
+            self.start_search()
+
+    def run_search(self, query):
+        self.search_refresh_timer.stop()
+        hits = self.search.search(query) if self.search else []
+        self.find_bar.set_hits(hits)
+        self.page_view.set_highlights(hits, self.find_bar.current_hit())
+
+    def on_search_index_updated(self, indexed, page_count):
+        """More pages are searchable; the hits are refreshed once the refresh timer fires"""
+        self.find_bar.set_progress(indexed, page_count)
+        if self.find_bar.query().strip() and not self.search_refresh_timer.isActive():
+            self.search_refresh_timer.start()
+
+    def refresh_search_hits(self):
+        """Search again among the pages indexed since, without moving away from the current hit"""
+        if self.search is not None and self.find_bar.query().strip():
+            current = self.find_bar.current_hit()
+            hits = self.search.search(self.find_bar.query())
+            self.find_bar.set_hits(hits, current[0] if current else None)
+            self.page_view.set_highlights(hits, self.find_bar.current_hit())
+
+    def show_search_hit(self, index):
+        """Scroll the current hit into view and draw it stronger than the others"""
+        hit = self.find_bar.current_hit()
+        self.page_view.set_highlights(self.find_bar.hits, hit)
+        if hit is not None:
+            page, rects = hit
+            rect = self.page_view.highlight_rect(page, rects[0]).toRect()
+            self.scroll_area.ensureVisible(self.page_view.x() + rect.center().x(),
+                                           self.page_view.y() + rect.center().y(), 50, 100)
+
+    def on_find_bar_closed(self):
+        self.page_view.set_highlights([])
+        self.scroll_area.setFocus()
+
+    def scroll_to_page(self, index):
+        """Scroll the page view so a page starts at the top of the viewport"""
+        if index < len(self.page_view.page_offsets):
+            y = self.page_view.y() + self.page_view.page_offsets[index]
+            self.scroll_area.verticalScrollBar().setValue(y)
+
+    def update_current_thumbnail(self):
+        """Select the thumbnail of the topmost visible page"""
+        if self.thumbnail_panel.isVisible():
+            pages = self.page_view.visible_pages()
+            if pages:
+                self.thumbnail_panel.set_current_page(pages[0])
+
     def save_pdf_to_path(self, source_path, new_path=None):
         """Save PDF to the specified path or generate a new path with '_modified' suffix"""
         try:
@@ -189,58 +437,149 @@ class PDFViewer(QMainWindow):
                 # Create new filename
                 new_path = os.path.join(directory, f"{filename}_modified.pdf")
 
-            # Copy the PDF
-            doc = fitz.open(source_path)
-            doc.save(new_path)
-            doc.close()
+            # Copy the file as is; there is nothing to re-serialize
+            from .saver import save_document
+            save_document(source_path, new_path)
             return new_path
         except Exception as e:
             print(f"Error saving PDF: {str(e)}")
             return None
 
+    def create_save_progress(self):
+        """Progress bar and cancel button shown in the status bar while saving"""
+        self.save_progress = QProgressBar()
+        self.save_progress.setMaximumWidth(200)
+        self.save_progress.setTextVisible(False)
+        self.save_cancel_button = QToolButton()
+        self.save_cancel_button.setIcon(self.style().standardIcon(QStyle.SP_DialogCancelButton))
+        self.save_cancel_button.setToolTip("Cancel saving")
+        self.save_cancel_button.clicked.connect(self.cancel_save)
+        self.statusBar().addPermanentWidget(self.save_progress)
+        self.statusBar().addPermanentWidget(self.save_cancel_button)
+        self.save_progress.hide()
+        self.save_cancel_button.hide()
+
     def save_pdf(self):
         if not self.current_file_path:
             QMessageBox.warning(self, "Warning", "Please open a PDF file first.")
             return
+        if self.background_save and self.background_save.is_running():
+            return
 
-        if self.annotator.annotations:
-            # Save with annotations
-            file_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Save PDF File",
-                "",
-                "PDF Files (*.pdf)"
-            )
-            if file_path:
-                # Close the current document before saving
-                if self.current_doc:
-                    self.current_doc.close()
-                    self.current_doc = None
-
-                if self.annotator.save_annotations(self.current_file_path, file_path):
-                    QMessageBox.information(self, "Success", "PDF saved successfully with annotations!")
-                    # If we saved to the current file, reload it
-                    if file_path == self.current_file_path:
-                        self.display_pdf(file_path)
-                    else:
-                        # Reopen the original file
-                        self.display_pdf(self.current_file_path)
-                else:
-                    QMessageBox.warning(self, "Error", "Failed to save PDF with annotations.")
-                    # Reopen the original file
-                    self.display_pdf(self.current_file_path)
-        else:
-            # Save without annotations
-            file_path, _ = QFileDialog.getSaveFileName(
-                self,
-                "Save PDF File",
-                "",
-                "PDF Files (*.pdf)"
-            )
-            if file_path:
-                saved_path = self.save_pdf_to_path(self.current_file_path, file_path)
-                if saved_path:
-                    QMessageBox.information(self, "Success", "PDF saved successfully!")
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save PDF File",
+            "",
+            "PDF Files (*.pdf)"
+        )
+        if not file_path:
+            return
+
+        # The document stays open; the save works on a snapshot of the strokes
+        annotations = self.annotator.annotations
+        self.saving_strokes = [(stroke, stroke.state()) for stroke in annotations]
+        self.background_save = BackgroundSave(self.current_file_path, file_path,
+                                              annotations if annotations else None,
+                                              self.annotator.flatten, self)
+        self.background_save.progress.connect(self.on_save_progress)
+        self.background_save.releaseRequested.connect(self.release_document)
+        self.background_save.finished.connect(self.on_save_finished)
+        self.background_save.failed.connect(self.on_save_failed)
+        self.background_save.cancelled.connect(self.on_save_cancelled)
+        self.background_save.start()
+
+        self.save_action.setEnabled(False)
+        self.save_progress.setRange(0, 0)  # Busy until the first progress report
+        self.save_progress.show()
+        self.save_cancel_button.show()
+        self.statusBar().showMessage(f"Saving {os.path.basename(file_path)}...")
+
+    def cancel_save(self):
+        if self.background_save:
+            self.background_save.cancel()
+            self.statusBar().showMessage("Cancelling save...")
+
+    def on_save_progress(self, done, total):
+        self.save_progress.setRange(0, total)
+        self.save_progress.setValue(done)
+
+    def end_save(self):
+        self.save_action.setEnabled(True)
+        self.save_progress.hide()
+        self.save_cancel_button.hide()
+        self.saving_strokes = []
+        if self.session and self.session.doc.is_closed:
+            # Released for a save that did not replace it after all
+            self.reload_session()
+
+    def release_document(self):
+        """
+        The running save is about to replace the open file. Windows cannot
+        replace a file that is open, so close it here and in every worker.
+        Nothing reads it again until it is reopened once the save is over.
+        """
+        if self.search is not None:
+            self.search.stop()
+        self.page_view.release_document()
+        self.renderer.recycle()
+        self.thumbnail_panel.recycle()
+        if self.session:
+            self.session.close()
+
+    def reload_session(self):
+        """Reopen the open file after it changed on disk and render it again"""
+        old_doc_id = self.page_view.doc_id
+        self.session.reopen()
+        self.page_view.reload_document()
+        self.thumbnail_panel.set_document(self.session.path, self.page_view.page_sizes)
+        self.reset_search()
+        self.render_cache.remove_document(old_doc_id)
+
+    def on_save_finished(self, summary):
+        from .saver import same_file
+        job = self.background_save
+        if (self.session and same_file(job.source_path, self.session.path)
+                and same_file(job.output_path, self.session.path)
+                and (self.saving_strokes or job.released)):
+            # The saved strokes are part of the file now; re-render instead of reloading
+            changed = self.remove_saved_strokes()
+            self.reload_session()
+            if changed:
+                plural = "s" if changed > 1 else ""
+                summary += f"; edits to {changed} stroke{plural} made while saving are not in the file"
+        self.end_save()
+        self.statusBar().showMessage(f"Saved {os.path.basename(job.output_path)} in {summary}", 5000)
+
+    def remove_saved_strokes(self):
+        """
+        Take the strokes the finished save wrote into the file out of the
+        annotator, leaving those edited since it started. Returns how many
+        saved strokes were edited or erased meanwhile; the file has them as
+        they were.
+        """
+        annotations = self.annotator.annotations
+        live = {id(stroke) for stroke in annotations}
+        changed = 0
+        for stroke, state in self.saving_strokes:
+            if id(stroke) in live and stroke.state() == state:
+                annotations.remove_stroke(stroke)
+            else:
+                changed += 1
+        live = {id(stroke) for stroke in annotations}
+        self.annotator.selected = [stroke for stroke in self.annotator.selected if id(stroke) in live]
+        self.annotator.hidden_strokes = {stroke for stroke in self.annotator.hidden_strokes if id(stroke) in live}
+        self.annotator.invalidate_layer()
+        return changed
+
+    def on_save_failed(self, message):
+        self.end_save()
+        self.statusBar().clearMessage()
+        print(f"Error saving PDF: {message}")
+        QMessageBox.warning(self, "Error", f"Failed to save PDF: {message}")
+
+    def on_save_cancelled(self):
+        self.end_save()
+        self.statusBar().showMessage("Save cancelled", 5000)
 
     def open_pdf(self, file_path=None):
         if not file_path:
@@ -251,36 +590,32 @@ class PDFViewer(QMainWindow):
                 "PDF Files (*.pdf)"
             )
         if file_path and os.path.exists(file_path):
-            self.current_file_path = file_path
-            self.display_pdf(file_path)
-            # Add to recent files
-            self.recent_files_manager.add_recent_file(file_path)
-            self.update_recent_files_menu()
+            with metrics.timer('viewer.open_file'):
+                self.current_file_path = file_path
+                self.display_pdf(file_path)
+                # Add to recent files
+                self.recent_files_manager.add_recent_file(file_path)
+                self.update_recent_files_menu()
             
+    @metrics.timed('viewer.display_pdf')
     def display_pdf(self, file_path):
-        if self.current_doc:
-            self.current_doc.close()
-            self.current_doc = None
+        if self.session:
+            self.page_view.set_document(None)
+            self.session.close()
+            self.session = None
+        self.reset_search()
 
         try:
-            self.current_doc = fitz.open(file_path)
-            if self.current_doc.page_count > 0:
-                page = self.current_doc.load_page(0)
-                
-                if hasattr(self, 'zoom_handler'):
-                    pixmap = self.zoom_handler.get_zoomed_pixmap(page)
-                else:
-                    # Default zoom factor 2 for better resolution if zoom handler not available
-                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2))
-                    img = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
-                    pixmap = QPixmap.fromImage(img)
-                
-                self.pdf_pixmap = pixmap
-                
-                # Update label with new pixmap
-                self.label.setPixmap(self.pdf_pixmap)
-                self.label.setScaledContents(False)  # Changed to False to prevent stretching
-                self.label.setAlignment(Qt.AlignCenter)
+            # Keep one open document for the lifetime of the view
+            from .session import DocumentSession
+            self.session = DocumentSession(file_path)
+            if self.session.page_count > 0:
+                # Only the pages around the viewport are rendered by the page view
+                self.page_view.set_scale(self.zoom_handler.zoom_factor * 2)
+                self.page_view.set_document(self.session)
+                self.thumbnail_panel.set_document(file_path, self.page_view.page_sizes)
+                if self.find_bar.isVisible():
+                    self.start_search()
                 
                 # Update window title with filename
                 self.setWindowTitle(f"PDF Viewer - {file_path}")
@@ -294,15 +629,57 @@ class PDFViewer(QMainWindow):
                     self.update_text_editor_geometry()
                 
             else:
-                self.label.setText("This PDF file appears to be empty.")
-                self.pdf_pixmap = None
+                self.page_view.set_message("This PDF file appears to be empty.")
+                self.thumbnail_panel.set_document(None, [])
         except Exception as e:
-            self.label.setText(f"Error loading PDF: {str(e)}")
-            self.pdf_pixmap = None
+            self.page_view.set_message(f"Error loading PDF: {str(e)}")
+            self.thumbnail_panel.set_document(None, [])
             print(f"Error: {str(e)}")
-            if self.current_doc:
-                self.current_doc.close()
-                self.current_doc = None
+            if self.session:
+                self.session.close()
+                self.session = None
+
+    def register_gauges(self):
+        metrics.add_gauge('render_cache.bytes', lambda: self.render_cache.current_bytes)
+        metrics.add_gauge('render_cache.hit_rate', lambda: round(
+            self.render_cache.hits / max(1, self.render_cache.hits + self.render_cache.misses), 3))
+        metrics.add_gauge('pageview.images_bytes', lambda: sum(
+            RenderCache.image_bytes(image) for image in self.page_view.images.values()))
+        metrics.add_gauge('annotator.layer_bytes', lambda: (
+            self.annotator.layer.sizeInBytes() if self.annotator.layer is not None else 0))
+        metrics.add_gauge('annotator.strokes', lambda: len(self.annotator.annotations))
+        metrics.add_gauge('renderer.pending', lambda: len(self.renderer.pending))
+        metrics.add_gauge('thumbnails.cached', lambda: len(self.thumbnail_panel.thumbnails))
+
+    def dump_metrics(self):
+        """Save a JSON snapshot of the performance metrics"""
+        file_path, _ = QFileDialog.getSaveFileName(
+            self,
+            "Save Performance Metrics",
+            "peedofile-metrics.json",
+            "JSON Files (*.json)"
+        )
+        if file_path:
+            metrics.dump(file_path)
+
+    def closeEvent(self, event):
+        """Stop background render workers when the window closes"""
+        if os.environ.get('PEEDOFILE_METRICS'):
+            # Log the session's metrics for bug reports
+            metrics.dump(os.environ['PEEDOFILE_METRICS'])
+        if self.background_save and self.background_save.is_running():
+            # Let a save that is already writing finish instead of leaving a broken file
+            self.background_save.cancel()
+            self.background_save.process.join()
+        # Drop rendered images first so their shared buffers are freed with the pool
+        self.page_view.images.clear()
+        self.render_cache.clear()
+        self.renderer.shutdown()
+        self.thumbnail_panel.shutdown()
+        if self.search is not None:
+            self.search.stop()
+        self.recent_files_manager.shutdown()
+        super().closeEvent(event)
 
     def wheelEvent(self, event):
         if not self.zoom_handler.handle_wheel_event(event):
@@ -323,18 +700,20 @@ class PDFViewer(QMainWindow):
                 self.toggle_annotate_action.setChecked(False)
                 self.toggle_annotation_mode()
             self.container.setCursor(Qt.IBeamCursor)
+            self.get_format_toolbar()
             self.text_editor.show()
             self.update_text_editor_geometry()
         else:
             self.container.setCursor(Qt.ArrowCursor)
-            self.format_toolbar.hide()
+            if self.format_toolbar:
+                self.format_toolbar.hide()
             self.text_editor.hide()
 
     def update_text_editor_geometry(self):
         """Update text editor overlay geometry to match PDF"""
-        if self.pdf_pixmap and self.text_mode:
-            # Get the geometry of the label with the PDF
-            pdf_rect = self.label.geometry()
+        if self.page_view.page_count() and self.text_mode:
+            # Get the geometry of the page view
+            pdf_rect = self.page_view.geometry()
             # Set the text editor to cover exactly the same area as the PDF
             self.text_editor.set_pdf_rect(pdf_rect)
             # Ensure text editor is on top
@@ -346,10 +725,16 @@ class PDFViewer(QMainWindow):
             if event.type() == event.MouseButtonPress and self.text_mode and event.button() == Qt.LeftButton:
                 # Convert position relative to container
                 pos = self.container.mapFromGlobal(event.globalPos())
-                if not self.label.geometry().contains(pos):
+                if self.page_view.page_at(pos - self.page_view.pos()) < 0:
                     return False
-                self.text_editor.create_text_box(pos)
+                self.text_editor.create_text_box(pos - self.page_view.pos())
                 return True
+        elif obj == self.scroll_area.viewport():
+            if event.type() == QEvent.Wheel:
+                if self.zoom_handler.handle_wheel_event(event):
+                    return True
+            elif event.type() in (QEvent.NativeGesture, QEvent.Gesture):
+                return self.zoom_handler.handle_gesture_event(event)
         return super().eventFilter(obj, event)
 
     def mousePressEvent(self, event):
@@ -358,17 +743,19 @@ class PDFViewer(QMainWindow):
 
     def on_text_editing_started(self):
         """Show text formatting toolbar when text editing starts"""
-        self.format_toolbar.show()
+        self.get_format_toolbar().show()
 
     def on_text_editing_finished(self):
         """Hide text formatting toolbar when text editing ends"""
-        self.format_toolbar.hide()
+        if self.format_toolbar:
+            self.format_toolbar.hide()
 
     def choose_annotation_color(self):
         """Open color dialog for annotation color selection"""
         color = QColorDialog.getColor(self.annotator.current_color)
         if color.isValid():
             self.annotator.current_color = color
+            self.annotator.recolor_selection(color)
             # Update the color button icon/style if needed
             icon_pixmap = QPixmap(16, 16)
             icon_pixmap.fill(color)
@@ -380,14 +767,18 @@ class PDFViewer(QMainWindow):
         recent_files = self.recent_files_manager.get_recent_files()
         
         for file_path in recent_files:
-            action = QAction(os.path.basename(file_path), self)
+            # Owned by the menu so rebuilding it deletes the old actions
+            action = QAction(os.path.basename(file_path), self.recent_files_menu)
+            thumbnail = self.recent_files_manager.thumbnail(file_path)
+            if thumbnail is not None:
+                action.setIcon(QIcon(QPixmap.fromImage(thumbnail)))
             action.setData(file_path)
             action.setToolTip(file_path)
             action.triggered.connect(lambda checked, path=file_path: self.open_pdf(path))
             self.recent_files_menu.addAction(action)
             
         if not recent_files:
-            no_files_action = QAction("No Recent Files", self)
+            no_files_action = QAction("No Recent Files", self.recent_files_menu)
             no_files_action.setEnabled(False)
             self.recent_files_menu.addAction(no_files_action)
 
@@ -396,42 +787,44 @@ class PDFViewer(QMainWindow):
         self.recent_files_manager.clear_recent_files()
         self.update_recent_files_menu()
 
-    def update_display(self):
+    @metrics.timed('viewer.update_display')
+    def update_display(self, anchor=None):
         """
-        Update the PDF display with current zoom factor
+        Update the PDF display with current zoom factor, keeping the spot of
+        the page under the global position anchor (or the viewport center) in place
         """
-        if not self.current_file_path or not hasattr(self, 'zoom_handler'):
+        if not self.session or not hasattr(self, 'zoom_handler'):
             return
 
-        doc = None
         try:
-            doc = fitz.open(self.current_file_path)
-            page = doc[0]  # For now, we're only showing the first page
-            
-            # Get zoomed pixmap from zoom handler
-            pixmap = self.zoom_handler.get_zoomed_pixmap(page)
-            self.label.setPixmap(pixmap)
-            
-            # Ensure the label maintains aspect ratio
-            self.label.setScaledContents(False)
-            self.label.setAlignment(Qt.AlignCenter)
+            viewport = self.scroll_area.viewport()
+            anchor = viewport.rect().center() if anchor is None else viewport.mapFromGlobal(anchor)
+            # Remember where the anchor is on its page as a fraction of the page size
+            point = self.page_view.mapFrom(viewport, anchor)
+            pages = self.page_view.pages_in_range(point.y(), point.y())
+            index = pages[0] if pages else 0
+            rect = self.page_view.page_rect(index)
+            fx = (point.x() - rect.left()) / rect.width()
+            fy = (point.y() - rect.top()) / rect.height()
+
+            # Relayout every page at the new zoom; only visible ones are re-rendered
+            self.page_view.set_scale(self.zoom_handler.zoom_factor * 2)
             
             # Update scroll area size
             self.scroll_area.setMinimumSize(1, 1)  # Reset minimum size
-            
-            # If we have an annotation overlay, update it
-            if self.annotation_mode and self.annotator:
-                # Get the geometry of the label with the PDF
-                pdf_rect = self.label.geometry()
-                # Update the annotator size and position
-                self.annotator.setGeometry(pdf_rect)
-                self.annotator.set_pdf_rect(pdf_rect)
-                self.annotator.raise_()
+
+            # Resize the pages now rather than on the next event loop pass, so
+            # the scroll bars can be moved to bring the anchored spot back
+            self.container_layout.activate()
+            QApplication.sendPostedEvents(viewport, QEvent.LayoutRequest)
+            rect = self.page_view.page_rect(index)
+            moved = self.page_view.mapTo(viewport, QPointF(rect.left() + fx * rect.width(),
+                                                           rect.top() + fy * rect.height()).toPoint()) - anchor
+            for bar, delta in ((self.scroll_area.horizontalScrollBar(), moved.x()),
+                               (self.scroll_area.verticalScrollBar(), moved.y())):
+                bar.setValue(bar.value() + delta)
         except Exception as e:
             QMessageBox.critical(self, "Error", f"Error updating PDF display: {str(e)}")
-        finally:
-            if doc:
-                doc.close()
 
     def open_file(self, file_path=None):
         # ...existing code...
@@ -1,15 +1,31 @@
 from PyQt5.QtWidgets import QHBoxLayout, QPushButton, QLabel, QWidget, QStyle
-from PyQt5.QtCore import Qt, QSize
+from PyQt5.QtCore import Qt, QSize, QTimer
 from PyQt5.QtGui import QImage, QPixmap, QIcon
-import fitz
+
+from .rendercache import RenderCache, document_id
+from .renderer import BufferImage
+from .metrics import metrics
 
 class PDFZoomHandler:
+    """
+    Zoom level of the viewer with its toolbar controls.
+
+    Wheel and pinch input is collected into one target zoom and applied at
+    most once per zoom_timer interval, so a fast scroll relayouts the pages
+    a few times instead of once per wheel notch. The parent's
+    update_display is passed the screen position to keep in place.
+    """
     def __init__(self, parent=None):
         self.parent = parent
         self.zoom_factor = 1.0
         self.min_zoom = 0.25
         self.max_zoom = 5.0
         self.zoom_step = 0.25
+        self.wheel_zoom_step = 1.15  # Zoom factor per wheel notch
+        self.pending_zoom = None  # Target of the wheel and pinch input not applied yet
+        self.zoom_anchor = None  # Global position of that input
+        self.render_cache = None  # Optional RenderCache shared with the page view
+        self.disk_cache = None  # Optional (directory, max bytes) of a DiskRenderCache
 
         # Create widget to hold zoom controls
         self.zoom_widget = QWidget()
@@ -40,6 +56,11 @@ class PDFZoomHandler:
         self.zoom_out_btn.clicked.connect(lambda: self.zoom_pdf(-self.zoom_step))
         self.zoom_in_btn.clicked.connect(lambda: self.zoom_pdf(self.zoom_step))
 
+        self.zoom_timer = QTimer(self.zoom_widget)
+        self.zoom_timer.setSingleShot(True)
+        self.zoom_timer.setInterval(30)
+        self.zoom_timer.timeout.connect(self.apply_pending_zoom)
+
     def get_layout(self):
         return self.zoom_layout
 
@@ -50,41 +71,119 @@ class PDFZoomHandler:
         """
         Adjust zoom level by delta amount while maintaining aspect ratio
         """
-        # Calculate new zoom factor
-        new_zoom = self.zoom_factor + delta
-        new_zoom = max(self.min_zoom, min(new_zoom, self.max_zoom))
+        self.set_zoom(self.zoom_factor + delta)
+
+    def set_zoom(self, zoom, anchor=None):
+        """Set the zoom factor, keeping the page under the global position anchor in place"""
+        new_zoom = max(self.min_zoom, min(zoom, self.max_zoom))
         
         if new_zoom != self.zoom_factor:
             self.zoom_factor = new_zoom
-            self.zoom_label.setText(f"{int(self.zoom_factor * 100)}%")
+            self.zoom_label.setText(f"{round(self.zoom_factor * 100)}%")
             
             if self.parent and hasattr(self.parent, 'update_display'):
-                self.parent.update_display()
+                self.parent.update_display(anchor)
+
+    def zoom_by(self, factor, anchor=None):
+        """Queue zooming by factor around anchor; queued zooms are applied together"""
+        zoom = self.zoom_factor if self.pending_zoom is None else self.pending_zoom
+        self.pending_zoom = max(self.min_zoom, min(zoom * factor, self.max_zoom))
+        self.zoom_anchor = anchor
+        if not self.zoom_timer.isActive():
+            self.zoom_timer.start()
+
+    def apply_pending_zoom(self):
+        zoom, self.pending_zoom = self.pending_zoom, None
+        if zoom is not None:
+            metrics.count('zoom.applied')
+            self.set_zoom(zoom, self.zoom_anchor)
 
     def handle_wheel_event(self, event):
         """
         Handle mouse wheel events for zooming
         """
         if event.modifiers() == Qt.ControlModifier:
-            # Calculate zoom step based on wheel direction
-            delta = event.angleDelta().y()
-            zoom_delta = self.zoom_step if delta > 0 else -self.zoom_step
-            self.zoom_pdf(zoom_delta)
+            # Touchpads send fractions of a notch
+            notches = event.angleDelta().y() / 120
+            if notches:
+                metrics.count('zoom.wheel_events')
+                self.zoom_by(self.wheel_zoom_step ** notches, event.globalPos())
             return True
         return False
 
+    def handle_gesture_event(self, event):
+        """
+        Handle pinch gestures for zooming: native trackpad gestures and
+        QPinchGesture from touchscreens
+        """
+        if event.type() == event.NativeGesture:
+            if event.gestureType() == Qt.ZoomNativeGesture:
+                self.zoom_by(1 + event.value(), event.globalPos())
+                return True
+        elif event.type() == event.Gesture:
+            pinch = event.gesture(Qt.PinchGesture)
+            if pinch is not None:
+                if pinch.changeFlags() & pinch.ScaleFactorChanged:
+                    self.zoom_by(pinch.scaleFactor(), pinch.centerPoint().toPoint())
+                event.accept(pinch)
+                return True
+        return False
+
     def reset_zoom(self):
         """
         Reset zoom to default value (100%)
         """
         self.zoom_factor = 1.0
+        self.pending_zoom = None
         self.zoom_label.setText("100%")
 
-    def get_zoomed_pixmap(self, page):
+    @metrics.timed('zoom.get_zoomed_image')
+    def get_zoomed_image(self, page, display_list=None, scale=None):
+        """
+        Get a zoomed QImage from a PDF page, rendering from its display list when given.
+        scale defaults to the current zoom at the base resolution.
+        The image shows the rendered samples in place instead of copying them.
+        Renders left on disk by an earlier session are used when disk_cache is set.
+        """
+        if scale is None:
+            scale = self.zoom_factor * 2  # Base resolution multiplier of 2
+        key = None
+        if self.render_cache is not None and page.parent.name:
+            key = RenderCache.make_key(document_id(page.parent.name), page.number, scale, page.rotation)
+            cached = self.render_cache.get(key)
+            if cached is not None:
+                return cached
+
+        import fitz  # PyMuPDF; imported on first use to keep startup fast
+        pix = disk_key = None
+        if self.disk_cache is not None and page.parent.name:
+            from . import diskcache
+            cache = diskcache.open_cache(*self.disk_cache)
+            disk_key = cache.make_key(diskcache.file_fingerprint(page.parent.name), page.number, scale)
+            pix = cache.get(disk_key)
+            metrics.count('disk_cache.misses' if pix is None else 'disk_cache.hits')
+        if pix is None and disk_key is None:
+            # Opaque 4-byte pixels give 32-bit aligned rows Qt paints without conversion
+            from .session import render_rgbx
+            pix = render_rgbx(display_list if display_list is not None else page.get_displaylist(), scale)
+        elif pix is None:
+            zoom_matrix = fitz.Matrix(scale, scale)
+            if display_list is not None:
+                pix = display_list.get_pixmap(matrix=zoom_matrix)
+            else:
+                pix = page.get_pixmap(matrix=zoom_matrix)
+            cache.put(disk_key, pix)
+        if not pix.alpha:
+            # The disk cache keeps RGB; add the opaque alpha channel here
+            pix = fitz.Pixmap(pix, 1)
+        img = BufferImage(pix.samples_mv, pix, pix.width, pix.height, pix.stride, QImage.Format_RGBX8888)
+        if key is not None:
+            self.render_cache.put(key, img)
+        return img
+
+    @metrics.timed('zoom.get_zoomed_pixmap')
+    def get_zoomed_pixmap(self, page, display_list=None):
         """
         Get a zoomed pixmap from a PDF page
         """
-        zoom_matrix = fitz.Matrix(self.zoom_factor * 2, self.zoom_factor * 2)  # Base resolution multiplier of 2
-        pix = page.get_pixmap(matrix=zoom_matrix)
-        img = QImage(pix.samples, pix.width, pix.height, pix.stride, QImage.Format_RGB888)
-        return QPixmap.fromImage(img)
+        return QPixmap.fromImage(self.get_zoomed_image(page, display_list))